@@ -1,33 +1,104 @@
 #!/usr/bin/env python3
 
+import asyncio
 import json
 import sys
-from typing import List, Dict, Any, TypedDict
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, TypedDict
 import structlog
 
-try:
+if TYPE_CHECKING:
     import litellm
 
-    # ストリーミングチャンクの繰り返し制限を設定
-    litellm.REPEATED_STREAMING_CHUNK_LIMIT = 30
+try:
+    import orjson
+
+    # orjson が利用可能ならツール引数のJSON解析に使用する (JSONDecodeError は json のサブクラス)
+    _json_loads = orjson.loads
 except ImportError:
-    print("Error: litellm package required. Install with 'pip install litellm'")
-    sys.exit(1)
+    _json_loads = json.loads
 
 # structlog の設定は logging_config.py に移動
 # 実際の設定は cli.py で行われる
 logger = structlog.get_logger(__name__)
 
 
+# タスク完了を示すセンチネル文字列
+TASK_COMPLETE_MARKER = "TASK_COMPLETE"
+
 # デフォルトプロンプト定数
 COMPLETION_CHECK_PROMPT = (
     "タスクは完了しましたか？\n"
-    "もし完了していれば、返答に必ず「TASK_COMPLETE」という文字列を含めてください。\n"
+    f"もし完了していれば、返答に必ず「{TASK_COMPLETE_MARKER}」という文字列を含めてください。\n"
     "まだ必要な操作がある場合は、ツールを呼び出して続行してください。"
 )
 FINAL_SUMMARY_PROMPT = (
     "タスクが完了しました。実行した内容の要約と結果を教えてください。"
 )
+# 完了メッセージ内の要約セクションの見出し
+SUMMARY_HEADING = "## 要約"
+
+# システムプロンプトの不変部分
+SYSTEM_PROMPT = (
+    "あなたは自律型のコーディングエージェントです。提示されたタスクを解決するために"
+    "ファイルシステム上のコードを読み込み、編集し、必要なら新規作成します。\n"
+    "タスクを次のステップで実行してください：\n"
+    "1. タスクを解析し、必要な操作の計画を立てる\n"
+    "2. 既存のコードを理解するために必要なファイルを読み込む\n"
+    "   - ユーザーから差分や具体的なコードの箇所を指摘された場合でも、情報が古い可能性があるため、編集前に必ず `read_file` ツールで最新のファイル内容を確認してから `edit_file` ツールを使用してください。\n"
+    "   - ユーザーが提示した内容が diff 形式（行頭に `+` や `-` が付く形式）の場合、`edit_file` ツールに渡すコードからは、これらの記号や差分情報を示す部分を取り除き、純粋なコードのみを指定するようにしてください。\n"
+    "3. 具体的な実装計画を立てる\n"
+    "4. コードを記述、編集する\n"
+    "5. コード編集後、シェルコマンド操作ツールを使用して、関連するテスト、リンター、フォーマッターを実行する\n"
+    "   - テストやリンターでエラーが検出された場合は、エラーメッセージをよく読み、問題が解決するまでコードを修正し、再度テスト/リンターを実行するプロセスを繰り返す\n"
+    "   - フォーマッターはコードの整形のために実行する\n"
+    "6. 全てのチェックが通ったら、結果を検証し、必要なら最終調整を行う\n\n"
+    "ファイルシステムツールとシェルコマンドツールを使って作業を進めてください。\n"
+    "互いに依存しない読み込み操作 (複数ファイルの読み込みや検索など) は、1ターンで tool_calls 配列に複数含めて並列に呼び出してください。\n"
+    f"タスクが完了したら、ツールを呼び出さずに返答に必ず「{TASK_COMPLETE_MARKER}」という文字列を含めてください。\n"
+    f"その返答には「{SUMMARY_HEADING}」という見出しに続けて、実行した内容の要約と結果を記述してください。"
+)
+
+# 同一ターン内で並行実行してよい読み取り専用のツール
+# それ以外 (書き込み、編集、シェルコマンド、未知のツール) は指定された順に1つずつ実行する
+READ_ONLY_TOOL_NAMES = frozenset(
+    {
+        "read_file",
+        "read_multiple_files",
+        "list_directory",
+        "search_files",
+        "get_file_info",
+        "directory_tree",
+    }
+)
+
+# プロンプトキャッシュの対象とする位置 (litellm が対応プロバイダ向けに cache_control を付与する)
+PROMPT_CACHE_INJECTION_POINTS = [{"location": "message", "role": "system"}]
+
+
+def extract_summary(content: str | None) -> str | None:
+    """完了メッセージから要約セクションを取り出す。見出しがなければ None を返す"""
+    if not content or SUMMARY_HEADING not in content:
+        return None
+    summary = content.split(SUMMARY_HEADING, 1)[1]
+    summary = summary.replace(TASK_COMPLETE_MARKER, "").strip()
+    return summary or None
+
+
+def _import_litellm():
+    """litellm を読み込んで返す
+
+    litellm は import に時間がかかるため、モジュール読み込み時ではなく
+    Agent の生成時に読み込み、--help などでは起動を遅らせないようにする。
+    """
+    try:
+        import litellm
+    except ImportError:
+        print("Error: litellm package required. Install with 'pip install litellm'")
+        sys.exit(1)
+
+    # ストリーミングチャンクの繰り返し制限を設定
+    litellm.REPEATED_STREAMING_CHUNK_LIMIT = 30
+    return litellm
 
 
 # ツール実行用の型定義
@@ -37,7 +108,21 @@ class ToolCall(TypedDict):
 
 
 class Message:
-    """会話メッセージを表現するクラス"""
+    """会話メッセージを表現するクラス
+
+    生成後にフィールドが変更されない前提で、to_dict() の結果をキャッシュする。
+    会話履歴には大量のインスタンスが溜まるため、__slots__ でメモリ使用量を抑える。
+    """
+
+    __slots__ = (
+        "_cached_dict",
+        "_token_count",
+        "content",
+        "name",
+        "role",
+        "tool_call_id",
+        "tool_calls",
+    )
 
     def __init__(
         self,
@@ -52,9 +137,18 @@ class Message:
         self.tool_calls = tool_calls
         self.tool_call_id = tool_call_id
         self.name = name
+        self._cached_dict: Dict[str, Any] | None = None
+        # Agent が計算したトークン数のキャッシュ
+        self._token_count: int | None = None
 
     def to_dict(self) -> Dict[str, Any]:
-        """メッセージをlitellm用の辞書形式に変換"""
+        """メッセージをlitellm用の辞書形式に変換 (初回のみ構築し、以降はキャッシュを返す)"""
+        if self._cached_dict is None:
+            self._cached_dict = self._build_dict()
+        return self._cached_dict
+
+    def _build_dict(self) -> Dict[str, Any]:
+        """litellm用の辞書を構築する"""
         result = {"role": self.role}
 
         if self.content is not None:
@@ -87,19 +181,36 @@ class Agent:
         repository_description_prompt: str = None,  # リポジトリ説明プロンプト
         request_timeout: int = 180,  # 1回のリクエストに対するタイムアウト秒数（CLIから調整可能、デフォルト180）
         max_input_tokens: int = None,  # LLMの最大入力トークン数
+        max_concurrent_tools: int = 8,  # 1ターン内で並行実行するツール呼び出しの最大数
+        max_history_messages: int = 40,  # LLMに渡す会話履歴の最大メッセージ数 (None で無制限)
+        prompt_caching: bool = True,  # システムプロンプトをプロバイダ側でキャッシュさせるか
+        stream: bool = False,  # LLMのレスポンスをストリーミングで受信するか
+        stream_handler: Callable[
+            [str], None
+        ] = None,  # ストリーミング時に本文の差分を受け取る関数
+        router: "litellm.Router" = None,  # 指定時は litellm.Router 経由で複数デプロイメントに振り分ける
     ):
+        self._litellm = _import_litellm()
         self.model = model
         self.temperature = temperature
         self.max_iterations = max_iterations
         self.conversation_history: List[Message] = []
+        # 最後に追加されたアシスタントメッセージ (履歴を逆順に走査せずに参照するため)
+        self._last_assistant: Message | None = None
         self.final_summary_prompt = final_summary_prompt
         # repository_description_prompt が None または空文字列の場合はそのまま None または空文字列を保持
         self.repository_description_prompt = repository_description_prompt
         self.max_input_tokens = max_input_tokens  # 最大生成トークン数を設定
+        self.max_history_messages = max_history_messages
 
         # 利用可能なツールを設定
         self.available_tools = available_tools or []
 
+        # ツール名からツール定義を引くための索引
+        self._tools_by_name = {
+            tool["function"]["name"]: tool for tool in self.available_tools
+        }
+
         # LLMに渡すツールスキーマ (execute関数を除いたもの)
         self.tools = [
             {k: v for k, v in tool.items() if k != "execute"}
@@ -112,6 +223,29 @@ class Agent:
 
         self.request_timeout = request_timeout
 
+        self.prompt_caching = prompt_caching
+        self.router = router
+        self.stream = stream
+        self.stream_handler = stream_handler
+
+        # 同一ターンのツール呼び出しを並行実行する際の同時実行数を制限
+        self.max_concurrent_tools = max_concurrent_tools
+        self._tool_semaphore = asyncio.Semaphore(max_concurrent_tools)
+
+        # 全リクエストで共通の引数は一度だけ組み立て、呼び出しごとに再構築しない
+        # ツールスキーマも同じリストオブジェクトを使い回す
+        self._base_completion_kwargs: Dict[str, Any] = {
+            "model": self.model,
+            "temperature": self.temperature,
+            # 最終要約では使わないが、Anthropicの要件を満たすため常にツールリストを提供する
+            "tools": self.tools,
+            "timeout": self.request_timeout,  # 1回のリクエスト用タイムアウト
+        }
+        if self.prompt_caching:
+            self._base_completion_kwargs["cache_control_injection_points"] = (
+                PROMPT_CACHE_INJECTION_POINTS
+            )
+
         logger.debug(
             "Agent initialized",
             model=self.model,
@@ -123,6 +257,20 @@ class Agent:
             else 0,
         )
 
+    def _append_message(self, message: Message) -> None:
+        """会話履歴にメッセージを追加し、最新のアシスタントメッセージを記録する"""
+        self.conversation_history.append(message)
+        if message.role == "assistant":
+            self._last_assistant = message
+
+    def _count_tokens(self, message: Message) -> int:
+        """メッセージのトークン数を返す。メッセージごとに一度だけローカルで計算する"""
+        if message._token_count is None:
+            message._token_count = self._litellm.token_counter(
+                model=self.model, messages=[message.to_dict()]
+            )
+        return message._token_count
+
     async def _get_messages_for_llm(self) -> List[Dict[str, Any]]:
         """
         LLMに渡すメッセージリストを作成する。トークン数制限を考慮する。
@@ -135,16 +283,17 @@ class Agent:
 
         messages_to_send = []
         current_tokens = 0
+        # 必須メッセージとして扱った先頭メッセージの数
+        required_count = 0
 
         # 1. 最初のシステムメッセージと最初のユーザープロンプトは必須
         # 最初のシステムメッセージ
         if self.conversation_history[0].role == "system":
             system_message = self.conversation_history[0].to_dict()
             messages_to_send.append(system_message)
+            required_count = 1
             if self.max_input_tokens is not None:
-                current_tokens += litellm.token_counter(
-                    model=self.model, messages=[system_message]
-                )
+                current_tokens += self._count_tokens(self.conversation_history[0])
 
         # 最初のユーザーメッセージ (システムメッセージの次にあると仮定)
         if (
@@ -152,12 +301,13 @@ class Agent:
             and self.conversation_history[1].role == "user"
         ):
             user_message = self.conversation_history[1].to_dict()
+            required_count = 2
             # 既にシステムメッセージが追加されているか確認
             if not messages_to_send or messages_to_send[-1] != user_message:
                 # トークンチェック
                 if self.max_input_tokens is not None:
-                    user_message_tokens = litellm.token_counter(
-                        model=self.model, messages=[user_message]
+                    user_message_tokens = self._count_tokens(
+                        self.conversation_history[1]
                     )
                     if current_tokens + user_message_tokens <= self.max_input_tokens:
                         messages_to_send.append(user_message)
@@ -170,18 +320,25 @@ class Agent:
                     messages_to_send.append(user_message)
 
         # 2. 最新の会話履歴からトークン制限を超えない範囲で追加
-        # 必須メッセージ以降の履歴を取得 (必須メッセージが2つと仮定)
-        remaining_history = self.conversation_history[2:]
-
+        # 必須メッセージ以降の履歴を取得
+        remaining_history = self.conversation_history[required_count:]
+        if self.max_history_messages is not None:
+            # 必須メッセージを含めて max_history_messages 件に収まるよう直近の履歴に限定する
+            recent_limit = max(self.max_history_messages - len(messages_to_send), 0)
+            remaining_history = remaining_history[
+                len(remaining_history) - recent_limit :
+            ]
+
+        # 新しい順に走査して追加し、最後に時系列順へ戻す
         temp_recent_messages: list[Dict[str, Any]] = []
+        temp_recent_tokens: list[int] = []
         for msg in reversed(remaining_history):
             msg_dict = msg.to_dict()
             if self.max_input_tokens is not None:
-                msg_tokens = litellm.token_counter(
-                    model=self.model, messages=[msg_dict]
-                )
+                msg_tokens = self._count_tokens(msg)
                 if current_tokens + msg_tokens <= self.max_input_tokens:
-                    temp_recent_messages.insert(0, msg_dict)  # 逆順なので先頭に追加
+                    temp_recent_messages.append(msg_dict)
+                    temp_recent_tokens.append(msg_tokens)
                     current_tokens += msg_tokens
                 else:
                     # トークン制限に達したらループを抜ける
@@ -194,28 +351,94 @@ class Agent:
                     )
                     break
             else:
-                temp_recent_messages.insert(0, msg_dict)
+                temp_recent_messages.append(msg_dict)
+                temp_recent_tokens.append(0)
+
+        # 対応するアシスタントメッセージが切り捨てられたツール結果は、APIエラーになるため除外する
+        while temp_recent_messages and temp_recent_messages[-1]["role"] == "tool":
+            temp_recent_messages.pop()
+            current_tokens -= temp_recent_tokens.pop()
+        temp_recent_messages.reverse()
 
         messages_to_send.extend(temp_recent_messages)
 
         logger.debug(
-            f"LLMに渡すメッセージ数: {len(messages_to_send)}, トークン数: {current_tokens if self.max_input_tokens is not None else 'N/A'}"
+            "LLMに渡すメッセージを作成しました",
+            message_count=len(messages_to_send),
+            token_count=current_tokens if self.max_input_tokens is not None else None,
         )
         return messages_to_send
 
+    async def _request_completion(self, messages: List[Dict[str, Any]]) -> Any:
+        """
+        LLMにリクエストを送信してレスポンスを返す。
+
+        stream が有効な場合はストリーミングで受信し、本文の差分を stream_handler に
+        逐次渡したうえで、チャンクを集約した非ストリーミング形式のレスポンスを返す。
+        """
+        completion_kwargs = {**self._base_completion_kwargs, "messages": messages}
+        # Router が指定されていれば、model をモデルグループ名として負荷分散・フェイルオーバーさせる
+        acompletion = (
+            self.router.acompletion if self.router else self._litellm.acompletion
+        )
+        if not self.stream:
+            return await acompletion(**completion_kwargs)
+
+        response_stream = await acompletion(
+            **completion_kwargs,
+            stream=True,
+            stream_options={"include_usage": True},  # 集約後のレスポンスにusageを含める
+        )
+        chunks = []
+        async for chunk in response_stream:
+            chunks.append(chunk)
+            if self.stream_handler and chunk.choices:
+                delta_content = chunk.choices[0].delta.content
+                if delta_content:
+                    self.stream_handler(delta_content)
+        response = self._litellm.stream_chunk_builder(chunks, messages=messages)
+        if response is None:
+            # チャンクを1つも受信できなかった場合は集約できないため、非ストリーミング時の
+            # APIエラーと同じ例外として呼び出し元に伝える
+            raise self._litellm.exceptions.APIError(
+                status_code=500,
+                message="LLMのストリーミングレスポンスにチャンクが含まれていませんでした",
+                llm_provider="",
+                model=self.model,
+            )
+        return response
+
+    async def _execute_tool_calls(
+        self, prepared_calls: List[tuple[str, Any, Dict[str, Any]]]
+    ) -> List[str]:
+        """
+        1ターン分のツール呼び出しを実行し、呼び出し順に結果を返す。
+        連続する読み取り専用ツールはまとめて並行実行し、それ以外のツールは
+        同じファイルへの変更が競合しないよう、前後の呼び出しを待ってから1つずつ実行する。
+        """
+        # _execute_tool は例外を結果文字列に変換するため return_exceptions は不要
+        results: List[str] = []
+        pending_reads = []
+        for tool_name, _, arguments in prepared_calls:
+            if tool_name in READ_ONLY_TOOL_NAMES:
+                pending_reads.append(self._execute_tool(tool_name, arguments))
+                continue
+            if pending_reads:
+                results.extend(await asyncio.gather(*pending_reads))
+                pending_reads = []
+            results.append(await self._execute_tool(tool_name, arguments))
+        if pending_reads:
+            results.extend(await asyncio.gather(*pending_reads))
+        return results
+
     async def _execute_tool(self, tool_name: str, arguments: Dict[str, Any]) -> str:
         """指定されたツールを実行してその結果を返す"""
-        logger.debug("Executing tool", tool_name=tool_name, arguments=arguments)
+        logger.debug(
+            "Executing tool", tool_name=tool_name, argument_keys=list(arguments)
+        )
 
         # ツール名に一致する実行関数を検索
-        tool_def = next(
-            (
-                tool
-                for tool in self.available_tools
-                if tool["function"]["name"] == tool_name
-            ),
-            None,
-        )
+        tool_def = self._tools_by_name.get(tool_name)
 
         if not tool_def or "execute" not in tool_def:
             logger.warning("Tool not found or not executable", tool_name=tool_name)
@@ -224,7 +447,8 @@ class Agent:
         try:
             # ツールの実行関数を呼び出す
             execute_func = tool_def["execute"]
-            result = await execute_func(arguments)
+            async with self._tool_semaphore:
+                result = await execute_func(arguments)
             logger.debug(
                 "Tool executed successfully",
                 tool_name=tool_name,
@@ -244,44 +468,31 @@ class Agent:
 
     async def _planning_phase(self, prompt: str) -> None:
         """計画フェーズ - ユーザープロンプトから実行計画を作成"""
-        logger.debug("Planning phase started", prompt=prompt)
+        logger.debug("Planning phase started", prompt_length=len(prompt))
 
         self.conversation_history = []
+        self._last_assistant = None
         logger.debug("Conversation history initialized")
 
-        # リポジトリ説明をシステムプロンプトに含める (存在する場合のみ)
-        repo_context_message = ""
+        # 不変の指示を先頭に置き、リポジトリ説明は末尾に追加する (存在する場合のみ)
+        # プロンプトキャッシュが効くよう、同じ設定なら毎回バイト単位で同一の内容になる
+        system_message_content = SYSTEM_PROMPT
         if (
             self.repository_description_prompt
             and self.repository_description_prompt.strip()
         ):
-            repo_context_message = f"作業対象のリポジトリに関する背景情報:\n---\n{self.repository_description_prompt.strip()}\n---\n\n"
-
-        system_message_content = (
-            f"{repo_context_message}"  # repo_context_message が空なら何も追加されない
-            "あなたは自律型のコーディングエージェントです。提示されたタスクを解決するために"
-            "ファイルシステム上のコードを読み込み、編集し、必要なら新規作成します。\n"
-            "タスクを次のステップで実行してください：\n"
-            "1. タスクを解析し、必要な操作の計画を立てる\n"
-            "2. 既存のコードを理解するために必要なファイルを読み込む\n"
-            "   - ユーザーから差分や具体的なコードの箇所を指摘された場合でも、情報が古い可能性があるため、編集前に必ず `read_file` ツールで最新のファイル内容を確認してから `edit_file` ツールを使用してください。\n"
-            "   - ユーザーが提示した内容が diff 形式（行頭に `+` や `-` が付く形式）の場合、`edit_file` ツールに渡すコードからは、これらの記号や差分情報を示す部分を取り除き、純粋なコードのみを指定するようにしてください。\n"
-            "3. 具体的な実装計画を立てる\n"
-            "4. コードを記述、編集する\n"
-            "5. コード編集後、シェルコマンド操作ツールを使用して、関連するテスト、リンター、フォーマッターを実行する\n"
-            "   - テストやリンターでエラーが検出された場合は、エラーメッセージをよく読み、問題が解決するまでコードを修正し、再度テスト/リンターを実行するプロセスを繰り返す\n"
-            "   - フォーマッターはコードの整形のために実行する\n"
-            "6. 全てのチェックが通ったら、結果を検証し、必要なら最終調整を行う\n\n"
-            "ファイルシステムツールとシェルコマンドツールを使って作業を進めてください。"
-        )
+            system_message_content += f"\n\n作業対象のリポジトリに関する背景情報:\n---\n{self.repository_description_prompt.strip()}\n---"
+
         system_message = Message(role="system", content=system_message_content)
-        logger.debug("System message created", content=system_message_content)
+        logger.debug(
+            "System message created", content_length=len(system_message_content)
+        )
 
         user_message = Message(role="user", content=prompt)
-        logger.debug("User message created", content=prompt)
+        logger.debug("User message created", content_length=len(prompt))
 
-        self.conversation_history.append(system_message)
-        self.conversation_history.append(user_message)
+        self._append_message(system_message)
+        self._append_message(user_message)
         logger.debug(
             "Initial messages added to conversation history",
             history_length=len(self.conversation_history),
@@ -289,14 +500,9 @@ class Agent:
 
         logger.debug("Generating initial plan from LLM")
         try:
-            response = await litellm.acompletion(
-                model=self.model,
-                messages=[
-                    msg.to_dict() for msg in self.conversation_history
-                ],  # プランニングフェーズでは全履歴を使用することが多い
-                temperature=self.temperature,
-                tools=self.tools,  # 更新されたツールリストを使用
-                timeout=self.request_timeout,  # 1回のリクエスト用タイムアウト
+            # トークン数を送信前にローカルで確認し、上限超過をAPIエラーより先に検出する
+            response = await self._request_completion(
+                await self._get_messages_for_llm()
             )
             logger.debug(
                 "LLM response received for initial plan", response_id=response.id
@@ -315,7 +521,7 @@ class Agent:
                 )
 
             assistant_message_data = response.choices[0].message
-            self.conversation_history.append(
+            self._append_message(
                 Message(
                     role="assistant",
                     content=assistant_message_data.get("content"),
@@ -324,8 +530,8 @@ class Agent:
             )
             logger.debug(
                 "Assistant message from initial plan added to history",
-                content=assistant_message_data.get("content"),
-                tool_calls=assistant_message_data.get("tool_calls"),
+                content_length=len(assistant_message_data.get("content") or ""),
+                tool_call_count=len(assistant_message_data.get("tool_calls") or []),
                 history_length=len(self.conversation_history),
             )
             logger.debug("Planning phase completed")
@@ -339,14 +545,7 @@ class Agent:
         logger.debug("Execution phase started")
 
         try:
-            assistant_message = next(
-                (
-                    msg
-                    for msg in reversed(self.conversation_history)
-                    if msg.role == "assistant"
-                ),
-                None,
-            )
+            assistant_message = self._last_assistant
 
             if not assistant_message:
                 logger.warning(
@@ -355,6 +554,11 @@ class Agent:
                 return False
 
             if not assistant_message.tool_calls:
+                # 完了のセンチネルが応答内にあれば、確認のための往復を省略する
+                if TASK_COMPLETE_MARKER in (assistant_message.content or ""):
+                    logger.info("Task completed based on in-band completion marker")
+                    return True
+
                 logger.debug(
                     "No tool calls found in assistant message, checking if task is complete."
                 )
@@ -362,19 +566,15 @@ class Agent:
                 completion_check_message = Message(
                     role="user", content=COMPLETION_CHECK_PROMPT
                 )
-                self.conversation_history.append(completion_check_message)
+                self._append_message(completion_check_message)
                 logger.debug(
                     "Sent completion check to LLM",
                     prompt=COMPLETION_CHECK_PROMPT,
                     history_length=len(self.conversation_history),
                 )
 
-                response = await litellm.acompletion(
-                    model=self.model,
-                    messages=await self._get_messages_for_llm(),  # 引数を削除
-                    temperature=self.temperature,
-                    tools=self.tools,  # 更新されたツールリストを使用
-                    timeout=self.request_timeout,  # 1回のリクエスト用タイムアウト
+                response = await self._request_completion(
+                    await self._get_messages_for_llm()
                 )
                 logger.debug(
                     "LLM response received for completion check",
@@ -394,7 +594,7 @@ class Agent:
                     )
 
                 check_message_data = response.choices[0].message
-                self.conversation_history.append(
+                self._append_message(
                     Message(
                         role="assistant",
                         content=check_message_data.get("content"),
@@ -403,13 +603,15 @@ class Agent:
                 )
                 logger.debug(
                     "Assistant message from completion check added to history",
-                    content=check_message_data.get("content"),
-                    tool_calls=check_message_data.get("tool_calls"),
+                    content_length=len(check_message_data.get("content") or ""),
+                    tool_call_count=len(check_message_data.get("tool_calls") or []),
                     history_length=len(self.conversation_history),
                 )
 
-                if not check_message_data.get("tool_calls") and "TASK_COMPLETE" in (
-                    check_message_data.get("content") or ""
+                check_content = check_message_data.get("content") or ""
+                if (
+                    not check_message_data.get("tool_calls")
+                    and TASK_COMPLETE_MARKER in check_content
                 ):
                     logger.info("Task confirmed complete by LLM")
                     return True
@@ -429,6 +631,8 @@ class Agent:
                 "Processing tool calls",
                 tool_call_count=len(assistant_message.tool_calls),
             )
+            # 各ツール呼び出しの引数を先に解析してから実行する
+            prepared_calls = []
             for tool_call in assistant_message.tool_calls or []:
                 tool_name = tool_call.get("function", {}).get("name")
                 arguments_str = tool_call.get("function", {}).get("arguments", "{}")
@@ -436,12 +640,12 @@ class Agent:
                 logger.debug(
                     "Preparing to execute tool",
                     tool_name=tool_name,
-                    arguments_str=arguments_str,
+                    arguments_length=len(arguments_str or ""),
                     tool_call_id=tool_call_id,
                 )
 
                 try:
-                    arguments = json.loads(arguments_str)
+                    arguments = _json_loads(arguments_str)
                 except json.JSONDecodeError:
                     logger.warning(
                         "Failed to parse tool arguments JSON",
@@ -450,7 +654,14 @@ class Agent:
                     )
                     arguments = {}
 
-                tool_result = await self._execute_tool(tool_name, arguments)
+                prepared_calls.append((tool_name, tool_call_id, arguments))
+
+            tool_results = await self._execute_tool_calls(prepared_calls)
+
+            # tool_call_id の対応を崩さないよう、元の順序で結果を履歴に追加
+            for (tool_name, tool_call_id, _), tool_result in zip(
+                prepared_calls, tool_results
+            ):
                 logger.debug(
                     "Tool execution result",
                     tool_name=tool_name,
@@ -463,7 +674,7 @@ class Agent:
                     name=tool_name,
                     content=tool_result,
                 )
-                self.conversation_history.append(tool_message)
+                self._append_message(tool_message)
                 logger.debug(
                     "Tool result message added to history",
                     tool_name=tool_name,
@@ -472,12 +683,8 @@ class Agent:
                 )
 
             logger.debug("Getting next actions from LLM after tool executions")
-            response = await litellm.acompletion(
-                model=self.model,
-                messages=await self._get_messages_for_llm(),  # 引数を削除
-                temperature=self.temperature,
-                tools=self.tools,  # 更新されたツールリストを使用
-                timeout=self.request_timeout,  # 1回のリクエスト用タイムアウト
+            response = await self._request_completion(
+                await self._get_messages_for_llm()
             )
             logger.debug(
                 "LLM response received for next actions", response_id=response.id
@@ -496,7 +703,7 @@ class Agent:
                 )
 
             new_message_data = response.choices[0].message
-            self.conversation_history.append(
+            self._append_message(
                 Message(
                     role="assistant",
                     content=new_message_data.get("content"),
@@ -505,15 +712,15 @@ class Agent:
             )
             logger.debug(
                 "Assistant message for next actions added to history",
-                content=new_message_data.get("content"),
-                tool_calls=new_message_data.get("tool_calls"),
+                content_length=len(new_message_data.get("content") or ""),
+                tool_call_count=len(new_message_data.get("tool_calls") or []),
                 history_length=len(self.conversation_history),
             )
 
             if (
                 not new_message_data.get("tool_calls")
                 and new_message_data.get("content")
-                and ("TASK_COMPLETE" in new_message_data.get("content"))
+                and (TASK_COMPLETE_MARKER in new_message_data.get("content"))
             ):
                 logger.info("Task completed successfully based on LLM response")
                 return True
@@ -546,43 +753,49 @@ class Agent:
             if is_completed:
                 logger.info("Task completed", iterations=i + 1)
 
-                final_prompt_message = Message(
-                    role="user", content=self.final_summary_prompt
-                )
-                self.conversation_history.append(final_prompt_message)
-                logger.debug(
-                    "Requesting final summary from LLM",
-                    prompt=self.final_summary_prompt,
-                    history_length=len(self.conversation_history),
+                # 完了メッセージに要約セクションが含まれていれば、要約用の追加リクエストを省略する
+                final_message_content = extract_summary(
+                    self.conversation_history[-1].content
                 )
+                if final_message_content is not None:
+                    logger.debug(
+                        "Using in-band summary from completion message",
+                        summary_length=len(final_message_content),
+                    )
+                else:
+                    final_prompt_message = Message(
+                        role="user", content=self.final_summary_prompt
+                    )
+                    self._append_message(final_prompt_message)
+                    logger.debug(
+                        "Requesting final summary from LLM",
+                        prompt=self.final_summary_prompt,
+                        history_length=len(self.conversation_history),
+                    )
 
-                final_response = await litellm.acompletion(
-                    model=self.model,
-                    messages=await self._get_messages_for_llm(),
-                    temperature=self.temperature,
-                    tools=self.tools,  # 使わないけど、ツールリストを提供して、Anthropicの要件を満たす
-                    timeout=self.request_timeout,  # 1回のリクエスト用タイムアウト
-                )
-                logger.debug(
-                    "LLM response received for final summary",
-                    response_id=final_response.id,
-                )
-                # トークン使用量を記録・ログ出力
-                if final_response.usage:
-                    prompt_tokens = final_response.usage.prompt_tokens
-                    completion_tokens = final_response.usage.completion_tokens
-                    self.total_prompt_tokens += prompt_tokens
-                    self.total_completion_tokens += completion_tokens
+                    final_response = await self._request_completion(
+                        await self._get_messages_for_llm()
+                    )
                     logger.debug(
-                        "LLM token usage for final summary",
-                        prompt_tokens=prompt_tokens,
-                        completion_tokens=completion_tokens,
-                        total_tokens=prompt_tokens + completion_tokens,
+                        "LLM response received for final summary",
+                        response_id=final_response.id,
                     )
+                    # トークン使用量を記録・ログ出力
+                    if final_response.usage:
+                        prompt_tokens = final_response.usage.prompt_tokens
+                        completion_tokens = final_response.usage.completion_tokens
+                        self.total_prompt_tokens += prompt_tokens
+                        self.total_completion_tokens += completion_tokens
+                        logger.debug(
+                            "LLM token usage for final summary",
+                            prompt_tokens=prompt_tokens,
+                            completion_tokens=completion_tokens,
+                            total_tokens=prompt_tokens + completion_tokens,
+                        )
 
-                final_message_content = final_response.choices[0].message.get(
-                    "content", "タスクは完了しましたが、要約情報はありません。"
-                )
+                    final_message_content = final_response.choices[0].message.get(
+                        "content", "タスクは完了しましたが、要約情報はありません。"
+                    )
                 logger.info(
                     "Agent run finished, returning final summary.",
                     summary_length=len(final_message_content),
@@ -1,10 +1,10 @@
 #!/usr/bin/env python3
 import asyncio
 import argparse
+import logging
 import os  # os モジュールをインポート
 import sys  # sys モジュールをインポート
 import toml  # toml をインポート
-from litellm import get_model_info  # get_model_info をインポート
 
 # agent と filesystem モジュールをインポート
 from llm_coder.agent import Agent
@@ -17,43 +17,27 @@ import structlog  # structlog をインポート (agent.py と同様の設定を
 logger = structlog.get_logger(__name__)
 
 
-def parse_args():
-    # 設定ファイル専用のパーサーを作成して、--config 引数を先に解析
+DEFAULT_CONFIG_FILENAME = "llm-coder-config.toml"
+
+
+def _build_config_parser() -> argparse.ArgumentParser:
+    """--config 引数だけを先に解析するためのパーサーを作成する"""
     config_parser = argparse.ArgumentParser(add_help=False)
-    default_config_filename = "llm-coder-config.toml"
     config_parser.add_argument(
         "--config",
         type=str,
-        default=default_config_filename,  # デフォルトファイル名を設定
-        help=f"TOML設定ファイルのパス (デフォルト: {default_config_filename})",
+        default=DEFAULT_CONFIG_FILENAME,  # デフォルトファイル名を設定
+        help="TOML設定ファイルのパス (デフォルト: %(default)s)",
     )
-    config_args, remaining_argv = config_parser.parse_known_args()
+    return config_parser
 
-    config_values = {}
-    # config_args.config は常に値を持つ (指定されたパスまたはデフォルトパス)
-    config_file_path_to_load = config_args.config
 
-    try:
-        if os.path.exists(config_file_path_to_load):
-            with open(config_file_path_to_load, "r", encoding="utf-8") as f:
-                config_values = toml.load(f)
-            logger.info(f"設定ファイル {config_file_path_to_load} を読み込みました。")
-        else:
-            if config_file_path_to_load == default_config_filename:
-                logger.debug(
-                    f"デフォルトの設定ファイルが見つかりません: {config_file_path_to_load}。設定は無視されます。"
-                )
-            else:
-                logger.warning(
-                    f"指定された設定ファイルが見つかりません: {config_file_path_to_load}"
-                )
-    except Exception as e:
-        logger.error(
-            f"設定ファイル {config_file_path_to_load} の読み込み中にエラーが発生しました: {e}"
-        )
-        # 設定ファイルの読み込みエラーは警告に留め、デフォルト値やCLI引数で続行する
+def _build_parser(config_parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
+    """メインのパーサーを作成する
 
-    # メインのパーサーを作成
+    default にはハードコードされたデフォルト値のみを設定する。
+    TOML設定ファイルの値は parse_args で解析時に適用する。
+    """
     parser = argparse.ArgumentParser(
         description="LLM Coder CLI",
         # epilog を追加して、設定ファイルの優先順位について説明
@@ -62,104 +46,194 @@ def parse_args():
         parents=[config_parser],
     )
 
-    # 各引数のデフォルト値を TOML ファイルの値で上書きし、最終的なデフォルト値を設定
     # prompt は位置引数のため、TOMLでのデフォルト指定方法を考慮
-    # nargs='?' の位置引数の場合、default はコマンドラインで省略された場合に適用される
-    prompt_default = config_values.get("prompt", None)
+    # nargs='?' の位置引数は省略時も default で上書きされるため SUPPRESS とし、
+    # 省略時の値は parse_args で事前に設定する
     parser.add_argument(
         "prompt",
         type=str,
         nargs="?",
-        default=prompt_default,
+        default=argparse.SUPPRESS,
         help="実行するプロンプト (省略時は標準入力から。TOMLファイルでも指定可能)",
     )
 
-    model_default = config_values.get("model", "gpt-4.1-nano")
     parser.add_argument(
         "--model",
         "-m",
         type=str,
-        default=model_default,
-        help=f"使用するLLMモデル (デフォルト: {model_default})",
+        default="gpt-4.1-nano",
+        help="使用するLLMモデル (デフォルト: %(default)s)",
     )
 
-    temperature_default = config_values.get("temperature", 0.2)
     parser.add_argument(
         "--temperature",
         "-t",
         type=float,
-        default=temperature_default,
-        help=f"LLMの温度パラメータ (デフォルト: {temperature_default})",
+        default=0.2,
+        help="LLMの温度パラメータ (デフォルト: %(default)s)",
     )
 
-    max_iterations_default = config_values.get("max_iterations", 10)
     parser.add_argument(
         "--max-iterations",
         "-i",
         type=int,
-        default=max_iterations_default,
-        help=f"最大実行イテレーション数 (デフォルト: {max_iterations_default})",
+        default=10,
+        help="最大実行イテレーション数 (デフォルト: %(default)s)",
     )
 
-    allowed_dirs_default = config_values.get("allowed_dirs", [os.getcwd()])
+    # 現在の作業ディレクトリは実行時に決まるため、デフォルト値は parse_args で設定する
     parser.add_argument(
         "--allowed-dirs",
         nargs="+",
-        default=allowed_dirs_default,
+        default=argparse.SUPPRESS,
         help="ファイルシステム操作を許可するディレクトリ（スペース区切りで複数指定可）"
-        f" (デフォルト: {allowed_dirs_default if allowed_dirs_default != [os.getcwd()] else '現在の作業ディレクトリ'})",
+        " (デフォルト: 現在の作業ディレクトリ)",
     )
 
-    repository_description_prompt_default = config_values.get(
-        "repository_description_prompt", ""
-    )
     parser.add_argument(
         "--repository-description-prompt",
         type=str,
-        default=repository_description_prompt_default,
+        default="",
         help="LLMに渡すリポジトリの説明プロンプト (デフォルト: TOMLファイルまたは空)",
     )
 
     # 出力ファイルのオプションを追加
-    output_default = config_values.get("output", None)
     parser.add_argument(
         "--output",
         "-o",
         type=str,
-        default=output_default,
+        default=None,
         help="実行結果を出力するファイルパス (デフォルト: なし、標準出力のみ)",
     )
 
     # 会話履歴出力ファイルのオプションを追加
-    conversation_history_default = config_values.get("conversation_history", None)
     parser.add_argument(
         "--conversation-history",
         "-ch",
         type=str,
-        default=conversation_history_default,
+        default=None,
         help="エージェントの会話履歴を出力するファイルパス (デフォルト: なし)",
     )
 
     # LLM APIのリクエストタイムアウトオプションを追加
-    request_timeout_default = config_values.get("request_timeout", 60)
     parser.add_argument(
         "--request-timeout",
         type=int,
-        default=request_timeout_default,
-        help=f"LLM APIリクエスト1回あたりのタイムアウト秒数 (デフォルト: {request_timeout_default})",
+        default=60,
+        help="LLM APIリクエスト1回あたりのタイムアウト秒数 (デフォルト: %(default)s)",
     )
 
     # 最大入力トークン数のオプションを追加
-    max_input_tokens_default = config_values.get("max_input_tokens", None)
     parser.add_argument(
         "--max-input-tokens",
         type=int,
-        default=max_input_tokens_default,
+        default=None,
         help="LLMの最大入力トークン数 (デフォルト: モデル固有の最大値)",
     )
 
+    # LLMに渡す会話履歴の最大メッセージ数のオプションを追加
+    parser.add_argument(
+        "--max-history-messages",
+        type=int,
+        default=40,
+        help="LLMに渡す会話履歴の最大メッセージ数 (デフォルト: %(default)s)",
+    )
+
+    # litellm.Router のモデルリストのオプションを追加
+    # TOML設定ファイルでは model_list に配列を直接記述することもできる
+    parser.add_argument(
+        "--model-list",
+        type=str,
+        default=None,
+        help="litellm.Router に渡す model_list を定義したTOMLファイルのパス (デフォルト: なし)",
+    )
+
+    # ストリーミング出力のオプションを追加
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        default=False,
+        help="LLMのレスポンスをストリーミングで受信し、逐次標準出力に表示する",
+    )
+
+    # ログレベルのオプションを追加
+    parser.add_argument(
+        "--log-level",
+        type=str.upper,
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        default="INFO",
+        help="ログの出力レベル (デフォルト: %(default)s)",
+    )
+
+    return parser
+
+
+# パーサーはモジュール読み込み時に一度だけ構築し、解析のたびに再構築しない
+_CONFIG_PARSER = _build_config_parser()
+_PARSER = _build_parser(_CONFIG_PARSER)
+# TOML設定ファイルから受け付けるキー (パーサーの引数名と同じ)
+_CONFIG_KEYS = frozenset(
+    action.dest for action in _PARSER._actions if action.dest not in ("help", "config")
+)
+
+
+def load_config(config_file_path: str) -> dict:
+    """TOML設定ファイルを読み込む。存在しない場合や読み込みに失敗した場合は空の辞書を返す"""
+    try:
+        if os.path.exists(config_file_path):
+            with open(config_file_path, "r", encoding="utf-8") as f:
+                config_values = toml.load(f)
+            logger.info(f"設定ファイル {config_file_path} を読み込みました。")
+            return config_values
+        if config_file_path == DEFAULT_CONFIG_FILENAME:
+            logger.debug(
+                f"デフォルトの設定ファイルが見つかりません: {config_file_path}。設定は無視されます。"
+            )
+        else:
+            logger.warning(
+                f"指定された設定ファイルが見つかりません: {config_file_path}"
+            )
+    except Exception as e:
+        logger.error(
+            f"設定ファイル {config_file_path} の読み込み中にエラーが発生しました: {e}"
+        )
+        # 設定ファイルの読み込みエラーは警告に留め、デフォルト値やCLI引数で続行する
+    return {}
+
+
+def parse_args(argv=None):
+    # --config 引数を先に解析
+    config_args, remaining_argv = _CONFIG_PARSER.parse_known_args(argv)
+    config_values = load_config(config_args.config)
+
+    # 実行時に決まるデフォルト値と TOML設定ファイルの値を名前空間に事前に設定する
+    # argparse は名前空間に既に存在する属性には default を適用しないため、
+    # コマンドライン引数 > TOML設定ファイル > ハードコードされたデフォルト値 の順になる
+    defaults = {"prompt": None, "allowed_dirs": [os.getcwd()]}
+    defaults.update(
+        (key, value) for key, value in config_values.items() if key in _CONFIG_KEYS
+    )
+    if "log_level" in defaults:
+        defaults["log_level"] = defaults["log_level"].upper()
+
     # remaining_argv を使って、--config 以外の引数を解析
-    return parser.parse_args(remaining_argv)
+    return _PARSER.parse_args(remaining_argv, namespace=argparse.Namespace(**defaults))
+
+
+def load_model_list(model_list) -> list | None:
+    """Router 用の model_list を取得する。ファイルパスが指定された場合はTOMLから読み込む"""
+    if not model_list:
+        return None
+    if isinstance(model_list, list):
+        return model_list
+    with open(model_list, "r", encoding="utf-8") as f:
+        return toml.load(f).get("model_list")
+
+
+def _write_stream_delta(delta: str) -> None:
+    """ストリーミングで受信した本文の差分を標準出力に逐次書き出す"""
+    sys.stdout.write(delta)
+    sys.stdout.flush()
 
 
 async def run_agent_from_cli(args):
@@ -168,14 +242,12 @@ async def run_agent_from_cli(args):
     if not prompt:  # プロンプトが引数で指定されなかった場合
         if sys.stdin.isatty():  # 標準入力がTTY（対話的）の場合のみメッセージ表示
             logger.info("プロンプトを標準入力から読み込みます (Ctrl+D で終了):")
-        lines = []
         try:
-            for line in sys.stdin:
-                lines.append(line.rstrip("\n"))
+            # 行ごとのループではなく一括で読み込み、末尾の改行のみ取り除く
+            prompt = sys.stdin.read().rstrip("\n")
         except KeyboardInterrupt:
             logger.warning("入力が中断されました。")
             return
-        prompt = "\n".join(lines)
         if not prompt.strip():
             logger.error("プロンプトが空です。実行を中止します。")
             return
@@ -210,10 +282,31 @@ async def run_agent_from_cli(args):
 
     logger.debug("Initializing agent from CLI")
 
+    # litellm は import に時間がかかるため、エージェントを実行する場合のみ読み込む
+    from litellm import Router, get_model_info
+
+    # model_list が指定されていれば Router を構築する
+    router = None
+    try:
+        model_list = load_model_list(args.model_list)
+    except Exception as e:
+        logger.error(f"model_list の読み込み中にエラーが発生しました: {e}")
+        sys.exit(1)
+    if model_list:
+        router = Router(model_list=model_list)
+        logger.info(
+            "Router initialized from model_list", deployment_count=len(model_list)
+        )
+
     # 最大入力トークン数を決定
     max_input_tokens = args.max_input_tokens
     if max_input_tokens is None:
-        model_info = get_model_info(args.model)
+        try:
+            model_info = get_model_info(args.model)
+        except Exception:
+            # Router のモデルグループ名など、litellm が情報を持たないモデル名の場合
+            logger.debug("Model info not found", model=args.model)
+            model_info = None
         if model_info and "max_input_tokens" in model_info:
             max_input_tokens = model_info["max_input_tokens"]
 
@@ -225,6 +318,10 @@ async def run_agent_from_cli(args):
         repository_description_prompt=args.repository_description_prompt,  # リポジトリ説明プロンプトを渡す
         request_timeout=args.request_timeout,  # LLM APIリクエストのタイムアウトを渡す
         max_input_tokens=max_input_tokens,  # 最大入力トークン数を渡す
+        max_history_messages=args.max_history_messages,  # 会話履歴の最大メッセージ数を渡す
+        stream=args.stream,  # ストリーミング受信の有無を渡す
+        stream_handler=_write_stream_delta if args.stream else None,
+        router=router,  # Router を渡す (未指定なら None)
     )
 
     logger.info("Starting agent run from CLI", prompt_length=len(prompt))
@@ -263,11 +360,32 @@ async def run_agent_from_cli(args):
     logger.info("Agent run completed from CLI")
 
 
+def _new_event_loop_factory():
+    """uvloop が利用可能ならそのイベントループを返すファクトリを、なければ None を返す"""
+    try:
+        import uvloop
+    except ImportError:
+        # Windows など uvloop が使えない環境では標準のイベントループを使う
+        return None
+    return uvloop.new_event_loop
+
+
+def configure_logging(log_level: str) -> None:
+    """structlog のログレベルを設定する。レベル未満のログ呼び出しは何もしないメソッドになる"""
+    structlog.configure(
+        wrapper_class=structlog.make_filtering_bound_logger(
+            logging.getLevelNamesMapping()[log_level]
+        )
+    )
+
+
 def run_cli():
     """Entry point for the CLI script."""
     args = parse_args()
+    configure_logging(args.log_level)
 
-    asyncio.run(run_agent_from_cli(args))
+    with asyncio.Runner(loop_factory=_new_event_loop_factory()) as runner:
+        runner.run(run_agent_from_cli(args))
 
 
 if __name__ == "__main__":
@@ -1,31 +1,31 @@
 #!/usr/bin/env python3
 
 import asyncio
+import bisect
 import os
 import json
-import sys
-from typing import List, Dict, Any, Optional, Literal
+import re
+import stat
+import weakref
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Literal, Tuple, TypedDict
 from datetime import datetime
 import fnmatch
 import difflib
 import structlog  # structlog をインポート
+from pydantic import BaseModel
 
-# Third-party imports (you may need to install these)
 try:
-    from pydantic import BaseModel
+    import orjson
 except ImportError:
-    print("Error: pydantic package required. Install with 'pip install pydantic'")
-    sys.exit(1)
+    # orjson が利用できない場合は標準の json でシリアライズする
+    orjson = None
 
 # structlog の基本的な設定
 logger = structlog.get_logger(__name__)
 
 
 # Schema definitions
-class ReadFileArgs(BaseModel):
-    path: str
-
-
 class ReadMultipleFilesArgs(BaseModel):
     paths: List[str]
 
@@ -46,18 +46,6 @@ class EditFileArgs(BaseModel):
     dryRun: bool = False
 
 
-class CreateDirectoryArgs(BaseModel):
-    path: str
-
-
-class ListDirectoryArgs(BaseModel):
-    path: str
-
-
-class DirectoryTreeArgs(BaseModel):
-    path: str
-
-
 class MoveFileArgs(BaseModel):
     source: str
     destination: str
@@ -69,32 +57,37 @@ class SearchFilesArgs(BaseModel):
     excludePatterns: List[str] = []
 
 
-class GetFileInfoArgs(BaseModel):
-    path: str
-
-
-class FileInfo(BaseModel):
+# ファイル情報 (時刻はエポックからのナノ秒で保持し、表示時にのみ変換する)
+class FileInfo(TypedDict):
     size: int
-    created: datetime
-    modified: datetime
-    accessed: datetime
+    created: int
+    modified: int
+    accessed: int
     isDirectory: bool
     isFile: bool
     permissions: str
 
 
-class TreeEntry(BaseModel):
+# FileInfo のうち、表示時に日時へ変換するフィールド
+_TIMESTAMP_FIELDS = ("created", "modified", "accessed")
+
+
+# ディレクトリツリーのノード (ノード数が多くなるため、モデルではなく辞書で構築する)
+class TreeEntry(TypedDict):
     name: str
     type: Literal["file", "directory"]
-    children: Optional[List["TreeEntry"]] = None
+    children: Optional[List["TreeEntry"]]
 
 
 # Path utilities
+# パスの変換は純粋な文字列処理のため、走査中に繰り返し呼ばれても再計算しないようキャッシュする
+@lru_cache(maxsize=8192)
 def normalize_path(p: str) -> str:
     """Normalize a path for consistent handling."""
     return os.path.normpath(p)
 
 
+@lru_cache(maxsize=8192)
 def expand_home(filepath: str) -> str:
     """Expand '~' to the user's home directory."""
     if filepath.startswith("~/") or filepath == "~":
@@ -106,17 +99,41 @@ def expand_home(filepath: str) -> str:
 
 # Global variables
 allowed_directories: list[str] = []
+# 許可ディレクトリの末尾に区切り文字を付けてソートしたもの (/foo が /foobar に一致しないようにする)
+# 他の許可ディレクトリ配下にあるものは除き、二分探索で前方一致を判定できるようにする
+_allowed_prefixes: list[str] = []
+
+
+def _build_allowed_prefixes(directories: list[str]) -> list[str]:
+    """許可ディレクトリから、互いに前方一致しないソート済みのプレフィックス一覧を作る"""
+    prefixes: list[str] = []
+    for prefix in sorted(d.rstrip(os.sep) + os.sep for d in directories):
+        # ソート済みなので、直前のプレフィックス配下でなければ以降とも重ならない
+        if not prefixes or not prefix.startswith(prefixes[-1]):
+            prefixes.append(prefix)
+    return prefixes
+
+
+def is_within_allowed_directories(path: str) -> bool:
+    """正規化済みの絶対パスが許可ディレクトリ (またはその配下) にあるかを判定する"""
+    candidate = path if path.endswith(os.sep) else path + os.sep
+    # プレフィックス一覧は互いに前方一致しないため、一致候補は candidate 以下で最大の要素のみ
+    index = bisect.bisect_right(_allowed_prefixes, candidate)
+    return index > 0 and candidate.startswith(_allowed_prefixes[index - 1])
 
 
 def initialize_filesystem_settings(directories: list[str]) -> None:
     """ファイルシステム操作が許可されるディレクトリを設定します。"""
-    global allowed_directories
+    global allowed_directories, _allowed_prefixes
+
+    _check_requested_path.cache_clear()
 
     if not directories:
         logger.warning(
             "許可されたディレクトリが指定されていません。ファイルシステム操作は制限されます。"
         )
         allowed_directories = []
+        _allowed_prefixes = []
         return
 
     valid_directories = []
@@ -144,6 +161,7 @@ def initialize_filesystem_settings(directories: list[str]) -> None:
         valid_directories.append(norm_dir)
 
     allowed_directories = valid_directories
+    _allowed_prefixes = _build_allowed_prefixes(valid_directories)
     logger.info(
         "ファイルシステム設定完了。",
         allowed_directories=allowed_directories,
@@ -156,41 +174,43 @@ async def validate_path(requested_path: str) -> str:
     Validate that a path is within allowed directories and resolve symlinks safely.
     Returns the real path if valid, raises an exception otherwise.
     """
-    expanded_path = expand_home(requested_path)
-    absolute = os.path.abspath(expanded_path)
+    # abspath はカレントディレクトリに依存するため、キャッシュのキーは絶対パスにする
+    return _validate_path_sync(os.path.abspath(expand_home(requested_path)))
+
+
+@lru_cache(maxsize=8192)
+def _check_requested_path(absolute: str) -> None:
+    """
+    要求されたパスの文字列が許可ディレクトリ内にあるかを確認する。
+    ファイルシステムに依存しない判定のみを絶対パスごとにキャッシュする (例外はキャッシュされない)。
+    キャッシュは許可ディレクトリの再設定時にクリアする。
+    """
     normalized_requested = normalize_path(absolute)
 
     # Check if path is within allowed directories
-    is_allowed = any(
-        normalized_requested.startswith(dir) for dir in allowed_directories
-    )
-    if not is_allowed:
+    if not is_within_allowed_directories(normalized_requested):
         raise ValueError(
             f"Access denied - path outside allowed directories: {absolute} not in {', '.join(allowed_directories)}"
         )
 
+
+def _validate_path_sync(absolute: str) -> str:
+    """
+    validate_path の本体。
+    実行中にパスがシンボリックリンクへ置き換えられる場合があるため、リンク先は毎回解決して確認する。
+    """
+    _check_requested_path(absolute)
+
     # Handle symlinks by checking their real path
     try:
         real_path = os.path.realpath(absolute)
-        normalized_real = normalize_path(real_path)
-        is_real_path_allowed = any(
-            normalized_real.startswith(dir) for dir in allowed_directories
-        )
-        if not is_real_path_allowed:
-            raise ValueError(
-                "Access denied - symlink target outside allowed directories"
-            )
-        return real_path
     except Exception:
         # For new files that don't exist yet, verify parent directory
         parent_dir = os.path.dirname(absolute)
         try:
             real_parent_path = os.path.realpath(parent_dir)
             normalized_parent = normalize_path(real_parent_path)
-            is_parent_allowed = any(
-                normalized_parent.startswith(dir) for dir in allowed_directories
-            )
-            if not is_parent_allowed:
+            if not is_within_allowed_directories(normalized_parent):
                 raise ValueError(
                     "Access denied - parent directory outside allowed directories"
                 )
@@ -198,20 +218,62 @@ async def validate_path(requested_path: str) -> str:
         except Exception:
             raise ValueError(f"Parent directory does not exist: {parent_dir}")
 
+    # リンク先の判定は realpath の失敗時の処理とは分け、親ディレクトリの確認で許可されないようにする
+    normalized_real = normalize_path(real_path)
+    if not is_within_allowed_directories(normalized_real):
+        raise ValueError("Access denied - symlink target outside allowed directories")
+    return real_path
+
 
 # File operation utilities
 async def get_file_stats(file_path: str) -> FileInfo:
     """Get detailed file statistics."""
-    stats = os.stat(file_path)
-    return FileInfo(
-        size=stats.st_size,
-        created=datetime.fromtimestamp(stats.st_ctime),
-        modified=datetime.fromtimestamp(stats.st_mtime),
-        accessed=datetime.fromtimestamp(stats.st_atime),
-        isDirectory=os.path.isdir(file_path),
-        isFile=os.path.isfile(file_path),
-        permissions=oct(stats.st_mode)[-3:],
-    )
+    # 種別も同じ stat の結果から判定し、isdir/isfile による追加の stat を省く
+    stats = await asyncio.to_thread(os.stat, file_path)
+    return {
+        "size": stats.st_size,
+        "created": stats.st_ctime_ns,
+        "modified": stats.st_mtime_ns,
+        "accessed": stats.st_atime_ns,
+        "isDirectory": stat.S_ISDIR(stats.st_mode),
+        "isFile": stat.S_ISREG(stats.st_mode),
+        "permissions": oct(stats.st_mode)[-3:],
+    }
+
+
+def format_timestamp_ns(timestamp_ns: int) -> str:
+    """エポックからのナノ秒をローカル時刻の日時文字列に変換する"""
+    return datetime.fromtimestamp(timestamp_ns / 1_000_000_000).isoformat(sep=" ")
+
+
+# ファイルを読み込む際のチャンクサイズ
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def read_text_file(path: str) -> str:
+    """
+    ファイルを開いて全体を読み込み、閉じる (to_thread で1回の呼び出しにまとめるため)。
+
+    バイト列をチャンクごとに bytearray へ読み込み、最後に一度だけデコードする。
+    改行はテキストモードの open と同様に \r\n と \r を \n に変換する。
+    """
+    fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        buffer = bytearray()
+        while chunk := os.read(fd, READ_CHUNK_SIZE):
+            buffer += chunk
+    finally:
+        os.close(fd)
+    content = buffer.decode("utf-8")
+    if "\r" in content:
+        content = content.replace("\r\n", "\n").replace("\r", "\n")
+    return content
+
+
+def write_text_file(path: str, content: str) -> None:
+    """ファイルを開いて書き込み、閉じる (to_thread で1回の呼び出しにまとめるため)"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
 
 
 async def get_gitignore_patterns(directory: str) -> List[str]:
@@ -232,49 +294,85 @@ async def get_gitignore_patterns(directory: str) -> List[str]:
     return patterns
 
 
+@lru_cache(maxsize=128)
+def compile_exclude_patterns(patterns: tuple[str, ...]) -> Optional[re.Pattern]:
+    """
+    除外パターンを1つの正規表現にまとめてコンパイルする (同じパターンの組は再利用する)。
+    パターンがなければ None を返す。
+    """
+    if not patterns:
+        return None
+    # fnmatch.fnmatch と同様に、パターンとパスの両方に normcase を適用して比較する
+    return re.compile(
+        "|".join(f"(?:{fnmatch.translate(os.path.normcase(p))})" for p in patterns)
+    )
+
+
+# ディレクトリ走査で同時に scandir するディレクトリ数の上限
+MAX_CONCURRENT_DIRECTORY_SCANS = 64
+
+
+def scan_directory(path: str) -> List[os.DirEntry]:
+    """ディレクトリのエントリを os.scandir で一度に取得する"""
+    with os.scandir(path) as it:
+        return list(it)
+
+
 async def search_files(
     root_path: str,
     pattern: str,
     exclude_patterns: List[str] = [],
     exact_match: bool = False,
 ) -> List[str]:
-    """Recursively search for files matching a pattern."""
-    results = []
+    """Recursively search for files matching a pattern.
 
-    async def search(current_path: str, current_exclude_patterns: List[str]):
-        combined_exclude_patterns = current_exclude_patterns
+    root_path は validate_path で検証済みのパスであることを前提とする。
+    """
+    exclude_regex = compile_exclude_patterns(tuple(exclude_patterns))
+    # 大文字小文字を区別しない比較のため、パターンは走査の前に一度だけ小文字化する
+    lowered_pattern = pattern.lower()
+    # 同時に開くディレクトリ数を制限し、ファイルディスクリプタの枯渇を防ぐ
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_DIRECTORY_SCANS)
 
+    async def search(current_path: str) -> List[str]:
         try:
-            entries = await asyncio.to_thread(os.listdir, current_path)
+            async with semaphore:
+                entries = await asyncio.to_thread(scan_directory, current_path)
         except OSError:
-            return
+            return []
 
+        matches = []
+        subdirectories = []
         for entry in entries:
-            full_path = os.path.join(current_path, entry)
-            relative_path_to_root = os.path.relpath(full_path, root_path)
+            full_path = entry.path
 
             try:
-                should_exclude = any(
-                    fnmatch.fnmatch(relative_path_to_root, p)
-                    or fnmatch.fnmatch(entry, p)
-                    for p in combined_exclude_patterns
-                )
-
-                if should_exclude:
+                # 名前とルートからの相対パスのいずれかが除外パターンに一致すれば除外する
+                if exclude_regex is not None and (
+                    exclude_regex.match(os.path.normcase(entry.name))
+                    or exclude_regex.match(
+                        os.path.normcase(os.path.relpath(full_path, root_path))
+                    )
+                ):
                     continue
 
-                await validate_path(full_path)
-
-                if await asyncio.to_thread(os.path.isfile, full_path):
-                    if exact_match:
-                        if entry.lower() == pattern.lower():
-                            results.append(full_path)
-                    else:
-                        if pattern.lower() in entry.lower():
-                            results.append(full_path)
-
-                if await asyncio.to_thread(os.path.isdir, full_path):
-                    await search(full_path, combined_exclude_patterns)
+                # 走査は検証済みのルート配下に留まるため、許可ディレクトリの外を
+                # 指しうるシンボリックリンクのみ検証する
+                if entry.is_symlink():
+                    await validate_path(full_path)
+
+                # DirEntry が保持する種別情報を使い、エントリごとの stat を省く
+                # (シンボリックリンクは os.path.isfile/isdir と同様にリンク先で判定する)
+                if entry.is_file():
+                    lowered_name = entry.name.lower()
+                    if (
+                        lowered_name == lowered_pattern
+                        if exact_match
+                        else lowered_pattern in lowered_name
+                    ):
+                        matches.append(full_path)
+                elif entry.is_dir():
+                    subdirectories.append(full_path)
             except ValueError:
                 continue
             except Exception as e:
@@ -283,8 +381,14 @@ async def search_files(
                 )
                 continue
 
-    await search(root_path, exclude_patterns)
-    return results
+        # サブディレクトリは並行して走査し、結果はエントリ順に連結する
+        for sub_matches in await asyncio.gather(
+            *(search(subdirectory) for subdirectory in subdirectories)
+        ):
+            matches.extend(sub_matches)
+        return matches
+
+    return await search(root_path)
 
 
 # File editing and diffing utilities
@@ -293,57 +397,215 @@ def normalize_line_endings(text: str) -> str:
     return text.replace("\r\n", "\n")
 
 
+# 差分に含める前後のコンテキスト行数 (difflib.unified_diff のデフォルトと同じ)
+DIFF_CONTEXT_LINES = 3
+_BACKTICK_RUN_RE = re.compile(r"`+")
+_HUNK_HEADER_RE = re.compile(r"^@@ -(\d+)(,\d+)? \+(\d+)(,\d+)? @@$")
+
+
+def _offset_hunk_header(header: str, offset: int) -> str:
+    """unified diff のハンクヘッダーの開始行番号を offset 行ずらす"""
+    if not offset:
+        return header
+    match = _HUNK_HEADER_RE.match(header)
+    if not match:
+        return header
+    old_start, old_length, new_start, new_length = match.groups()
+    return (
+        f"@@ -{int(old_start) + offset}{old_length or ''} "
+        f"+{int(new_start) + offset}{new_length or ''} @@"
+    )
+
+
 def create_unified_diff(
     original_content: str, new_content: str, filepath: str = "file"
 ) -> str:
     """Create a unified diff between original and new content."""
-    normalized_original = normalize_line_endings(original_content)
-    normalized_new = normalize_line_endings(new_content)
-
-    diff_lines = list(
-        difflib.unified_diff(
-            normalized_original.splitlines(),
-            normalized_new.splitlines(),
-            fromfile=f"{filepath} (original)",
-            tofile=f"{filepath} (modified)",
-            lineterm="",
-        )
+    original_lines = normalize_line_endings(original_content).splitlines()
+    new_lines = normalize_line_endings(new_content).splitlines()
+
+    # 先頭と末尾の共通する行は差分の計算から除き、編集箇所の周辺だけを比較する
+    # (ファイル全体に SequenceMatcher をかけると大きなファイルで非常に遅くなるため)
+    max_common = min(len(original_lines), len(new_lines))
+    prefix = 0
+    while prefix < max_common and original_lines[prefix] == new_lines[prefix]:
+        prefix += 1
+    suffix = 0
+    while (
+        suffix < max_common - prefix
+        and original_lines[-1 - suffix] == new_lines[-1 - suffix]
+    ):
+        suffix += 1
+
+    # 前後のコンテキスト行は残しておき、ハンクの行番号は切り出した分だけずらす
+    start = max(0, prefix - DIFF_CONTEXT_LINES)
+    trailing = max(0, suffix - DIFF_CONTEXT_LINES)
+    diff_lines = difflib.unified_diff(
+        original_lines[start : len(original_lines) - trailing],
+        new_lines[start : len(new_lines) - trailing],
+        fromfile=f"{filepath} (original)",
+        tofile=f"{filepath} (modified)",
+        lineterm="",
+        n=DIFF_CONTEXT_LINES,
     )
 
-    return "\n".join(diff_lines)
+    return "\n".join(
+        _offset_hunk_header(line, start) if line.startswith("@@") else line
+        for line in diff_lines
+    )
 
 
-async def apply_file_edits(
-    file_path: str, edits: List[dict], dry_run: bool = False
-) -> str:
-    """Apply edits to a file and return the diff."""
-    with open(file_path, "r", encoding="utf-8") as f:
-        content = normalize_line_endings(f.read())
+def _build_line_index(stripped_lines: List[str]) -> Dict[str, List[int]]:
+    """strip 済みの各行から、その行が現れる位置 (昇順) への索引を作る"""
+    index: Dict[str, List[int]] = {}
+    for i, line in enumerate(stripped_lines):
+        index.setdefault(line, []).append(i)
+    return index
 
-    modified_content = content
-    for edit in edits:
-        normalized_old = normalize_line_endings(edit["oldText"])
-        normalized_new = normalize_line_endings(edit["newText"])
 
-        if normalized_old in modified_content:
-            modified_content = modified_content.replace(normalized_old, normalized_new)
+def _replace_line_range(
+    content_lines: List[str],
+    stripped_lines: List[str],
+    line_index: Optional[Dict[str, List[int]]],
+    start: int,
+    end: int,
+    new_lines: List[str],
+) -> Optional[Dict[str, List[int]]]:
+    """
+    content_lines[start:end] を new_lines で置き換え、strip 済みの行と索引も合わせて更新する。
+    行数が変わると以降の位置がすべてずれるため、索引は破棄して None を返す (次の照合時に作り直す)。
+    """
+    stripped_new_lines = [line.strip() for line in new_lines]
+    if line_index is not None and len(new_lines) == end - start:
+        # 行数が変わらなければ、置き換えた行の位置だけ索引を更新する
+        for i, (before, after) in enumerate(
+            zip(stripped_lines[start:end], stripped_new_lines), start
+        ):
+            if before != after:
+                line_index[before].remove(i)
+                bisect.insort(line_index.setdefault(after, []), i)
+    else:
+        line_index = None
+    content_lines[start:end] = new_lines
+    stripped_lines[start:end] = stripped_new_lines
+    return line_index
+
+
+def _find_literal_in_lines(
+    lines: List[str], old: str, new: str
+) -> List[Tuple[int, int, List[str]]]:
+    """
+    "\n".join(lines).replace(old, new) と同じ置換を、行リストを連結せずに求める。
+    置き換える行の範囲と置換後の行を (開始行, 終了行 (含まない), 置換後の行) として順に返す。
+    """
+    spans: List[Tuple[int, int, List[str]]] = []
+    parts = old.split("\n")
+    if len(parts) == 1:
+        # 改行を含まない oldText は行をまたがないため、行ごとに置換すればよい
+        for i, line in enumerate(lines):
+            if old in line:
+                spans.append((i, i + 1, line.replace(old, new).split("\n")))
+        return spans
+
+    # 先頭の断片で終わる行、中間の断片と等しい行、末尾の断片で始まる行が続く位置を左から探す
+    head, middle, tail = parts[0], parts[1:-1], parts[-1]
+    span_lines = len(parts) - 1
+    span_start: Optional[int] = (
+        None  # 置換中の範囲の開始行 (直前の一致と行を共有する間は続く)
+    )
+    pending = ""  # 置換中の範囲の、置換後のテキスト
+    i, column = 0, 0  # 次に探し始める位置 (直前の一致の終了行では、一致の直後から)
+    while i + span_lines < len(lines):
+        line = lines[i]
+        start = len(line) - len(head)
+        if (
+            start >= column
+            and line.endswith(head)
+            and lines[i + span_lines].startswith(tail)
+            and lines[i + 1 : i + span_lines] == middle
+        ):
+            if span_start is None:
+                span_start = i
+                pending = line[:start]
+            else:
+                pending += line[column:start]
+            pending += new
+            i, column = i + span_lines, len(tail)
             continue
+        if span_start is not None:
+            pending += line[column:]
+            spans.append((span_start, i + 1, pending.split("\n")))
+            span_start = None
+        i, column = i + 1, 0
+    if span_start is not None:
+        pending += lines[i][column:]
+        spans.append((span_start, i + 1, pending.split("\n")))
+    return spans
+
+
+def apply_edits_sequentially(content: str, edits: List[EditOperation]) -> str:
+    """編集を1つずつ順番に適用する。完全一致しない場合は空白を無視した行単位で照合する"""
+    # 行単位の照合が必要になるまでは文字列のまま置換し、一度行リストに分割した後は
+    # 完全一致の置換も行リストのまま行って、編集ごとに split/join しないようにする
+    modified_content: Optional[str] = content
+    content_lines: Optional[List[str]] = None
+    stripped_content_lines: Optional[List[str]] = None
+    # strip 後の行 → 出現位置 の索引。行単位の照合で毎回全行を走査しないようにする
+    line_index: Optional[Dict[str, List[int]]] = None
+    for edit in edits:
+        normalized_old = normalize_line_endings(edit.oldText)
+        normalized_new = normalize_line_endings(edit.newText)
+
+        if content_lines is None:
+            if normalized_old in modified_content:
+                modified_content = modified_content.replace(
+                    normalized_old, normalized_new
+                )
+                continue
+        else:
+            spans = _find_literal_in_lines(
+                content_lines, normalized_old, normalized_new
+            )
+            if spans:
+                # 後ろの範囲から置き換え、前の範囲の行番号がずれないようにする
+                for start, end, new_lines in reversed(spans):
+                    line_index = _replace_line_range(
+                        content_lines,
+                        stripped_content_lines,
+                        line_index,
+                        start,
+                        end,
+                        new_lines,
+                    )
+                continue
 
         old_lines = normalized_old.split("\n")
-        content_lines = modified_content.split("\n")
+        if content_lines is None:
+            content_lines = modified_content.split("\n")
+            # 各行の strip は一度だけ行う
+            stripped_content_lines = [line.strip() for line in content_lines]
+        if line_index is None:
+            line_index = _build_line_index(stripped_content_lines)
         match_found = False
 
-        for i in range(len(content_lines) - len(old_lines) + 1):
+        # 先頭行が一致する位置のみ照合する
+        stripped_old_lines = [line.strip() for line in old_lines]
+        first_old_line = stripped_old_lines[0]
+        last_offset = len(content_lines) - len(old_lines)
+        candidate_offsets = line_index.get(first_old_line, [])
+
+        for i in candidate_offsets:
+            if i > last_offset:
+                break
             potential_match = content_lines[i : i + len(old_lines)]
 
-            is_match = all(
-                old_line.strip() == content_line.strip()
-                for old_line, content_line in zip(old_lines, potential_match)
+            is_match = (
+                stripped_content_lines[i : i + len(old_lines)] == stripped_old_lines
             )
 
             if is_match:
                 original_indent = ""
-                indent_match = potential_match[0].match(r"^\s*")
+                indent_match = re.match(r"^\s*", potential_match[0])
                 if indent_match:
                     original_indent = indent_match.group(0)
 
@@ -356,11 +618,11 @@ async def apply_file_edits(
                         new_indent = ""
 
                         if j < len(old_lines):
-                            old_indent_match = old_lines[j].match(r"^\s*")
+                            old_indent_match = re.match(r"^\s*", old_lines[j])
                             if old_indent_match:
                                 old_indent = old_indent_match.group(0)
 
-                        new_indent_match = line.match(r"^\s*")
+                        new_indent_match = re.match(r"^\s*", line)
                         if new_indent_match:
                             new_indent = new_indent_match.group(0)
 
@@ -374,69 +636,247 @@ async def apply_file_edits(
                         else:
                             new_lines.append(line)
 
-                content_lines[i : i + len(old_lines)] = new_lines
-                modified_content = "\n".join(content_lines)
+                line_index = _replace_line_range(
+                    content_lines,
+                    stripped_content_lines,
+                    line_index,
+                    i,
+                    i + len(old_lines),
+                    new_lines,
+                )
+                modified_content = None
                 match_found = True
                 break
 
         if not match_found:
-            raise ValueError(f"Could not find exact match for edit:\n{edit['oldText']}")
+            raise ValueError(f"Could not find exact match for edit:\n{edit.oldText}")
+
+    if modified_content is None:
+        modified_content = "\n".join(content_lines)
+    return modified_content
+
+
+def _prefix_function(text: str) -> List[int]:
+    """KMP 法の失敗関数 (各位置までの接頭辞における、接頭辞と接尾辞の最長一致長) を返す"""
+    prefix = [0] * len(text)
+    matched = 0
+    for i in range(1, len(text)):
+        while matched and text[i] != text[matched]:
+            matched = prefix[matched - 1]
+        if text[i] == text[matched]:
+            matched += 1
+        prefix[i] = matched
+    return prefix
+
+
+def _texts_can_overlap(first: str, second: str) -> bool:
+    """
+    first の末尾と second の先頭が重なりうるか (first の真の接尾辞が second の接頭辞か)。
+    KMP 法で first を second と照合し、O(len(first) + len(second)) で判定する。
+    """
+    if not first or not second:
+        return False
+    prefix = _prefix_function(second)
+    # first を走査し終えた時点で、first の接尾辞と一致している second の接頭辞の最長の長さ
+    matched = 0
+    for char in first:
+        # second 全体と一致した後は、次の文字と照合できるよう一致長を縮める
+        if matched == len(second):
+            matched = prefix[matched - 1]
+        while matched and char != second[matched]:
+            matched = prefix[matched - 1]
+        if char == second[matched]:
+            matched += 1
+    # first 全体との一致は重なりではないため、より短い一致をたどる
+    while matched >= len(first):
+        matched = prefix[matched - 1]
+    return matched > 0
+
+
+def apply_literal_edits_in_one_pass(
+    content: str, edits: List[EditOperation]
+) -> Optional[str]:
+    """
+    全ての編集の oldText がそのまま含まれる場合に、1回の走査でまとめて置換する。
+
+    順番に str.replace した場合と結果が同じになることを確認できない場合は None を返す。
+    """
+    if len(edits) < 2:
+        # 編集が1つなら str.replace でも1回の走査で済む
+        return None
+
+    old_texts = [normalize_line_endings(edit.oldText) for edit in edits]
+    new_texts = [normalize_line_endings(edit.newText) for edit in edits]
+    if not all(old_texts) or len(set(old_texts)) != len(old_texts):
+        return None
+    # 出現箇所が他の oldText と重なりうる場合や、置換後のテキストに oldText が
+    # 含まれる場合は、順番に置換した結果と異なりうるため、まとめて置換しない
+    for i, old in enumerate(old_texts):
+        for j, other in enumerate(old_texts):
+            if i != j and (old in other or _texts_can_overlap(old, other)):
+                return None
+        if any(old in new for new in new_texts):
+            return None
+
+    replacements = dict(zip(old_texts, new_texts))
+    pattern = re.compile("|".join(re.escape(old) for old in old_texts))
+    max_old_length = max(len(old) for old in old_texts)
+
+    parts = []
+    matched = set()
+    last_end = 0
+    for match in pattern.finditer(content):
+        start, end = match.span()
+        old = match.group(0)
+        new = replacements[old]
+        # 置換箇所が近接している場合や、置換によって前後のテキストと合わせて
+        # 新たに oldText が現れる場合は、順番に適用する処理に任せる
+        if parts and start - last_end < max_old_length:
+            return None
+        surroundings = (
+            content[max(0, start - max_old_length) : start]
+            + new
+            + content[end : end + max_old_length]
+        )
+        if any(old_text in surroundings for old_text in old_texts):
+            return None
+        parts.append(content[last_end:start])
+        parts.append(new)
+        matched.add(old)
+        last_end = end
+
+    # 一致しない編集がある場合は、空白を無視した照合を含めて順番に適用する
+    if len(matched) != len(old_texts):
+        return None
+    parts.append(content[last_end:])
+    return "".join(parts)
+
+
+# 同じファイルへの読み込みから書き込みまでを直列化するためのパスごとのロック
+# 使用中のロックのみを保持し、不要になったものは自動的に破棄する
+_file_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = (
+    weakref.WeakValueDictionary()
+)
+
+
+def get_file_lock(file_path: str) -> asyncio.Lock:
+    """指定したパスのファイル操作を直列化するロックを返す"""
+    lock = _file_locks.get(file_path)
+    if lock is None:
+        lock = asyncio.Lock()
+        _file_locks[file_path] = lock
+    return lock
+
+
+def apply_file_edits_sync(
+    file_path: str, edits: List[EditOperation], dry_run: bool = False
+) -> str:
+    """ファイルの読み込み、編集、書き込みを続けて行い、整形した差分を返す"""
+    content = normalize_line_endings(read_text_file(file_path))
+
+    modified_content = apply_literal_edits_in_one_pass(content, edits)
+    if modified_content is None:
+        modified_content = apply_edits_sequentially(content, edits)
 
     diff = create_unified_diff(content, modified_content, file_path)
 
-    num_backticks = 3
-    while "`" * num_backticks in diff:
-        num_backticks += 1
+    # 差分中の最長のバッククォートの連続より長いフェンスで囲む (1回の走査で求める)
+    longest_backticks = max(
+        (len(run) for run in _BACKTICK_RUN_RE.findall(diff)), default=0
+    )
+    num_backticks = max(3, longest_backticks + 1)
     formatted_diff = f"{'`' * num_backticks}diff\n{diff}\n{'`' * num_backticks}\n\n"
 
     if not dry_run:
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(modified_content)
+        write_text_file(file_path, modified_content)
 
     return formatted_diff
 
 
+async def apply_file_edits(
+    file_path: str, edits: List[EditOperation], dry_run: bool = False
+) -> str:
+    """Apply edits to a file and return the diff."""
+    # 読み込みから書き込みまでを1回のスレッド呼び出しで行い、同じパスへの編集はロックで直列化する
+    # (間に他の編集が割り込むと、その変更が失われるため)
+    async with get_file_lock(file_path):
+        return await asyncio.to_thread(apply_file_edits_sync, file_path, edits, dry_run)
+
+
 async def build_directory_tree(current_path: str) -> List[TreeEntry]:
     """Build a recursive tree structure of directories and files."""
-    valid_path = await validate_path(current_path)
-    entries = os.listdir(valid_path)
-    result = []
-
-    for entry in entries:
-        entry_path = os.path.join(valid_path, entry)
-        is_dir = os.path.isdir(entry_path)
-
-        entry_data = TreeEntry(
-            name=entry,
-            type="directory" if is_dir else "file",
-            children=[] if is_dir else None,
+    # 同時に開くディレクトリ数を制限し、ファイルディスクリプタの枯渇を防ぐ
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_DIRECTORY_SCANS)
+
+    async def build(path: str) -> List[TreeEntry]:
+        valid_path = await validate_path(path)
+        async with semaphore:
+            entries = await asyncio.to_thread(scan_directory, valid_path)
+        result = []
+        directories = []
+
+        for entry in entries:
+            if entry.is_symlink():
+                # 許可ディレクトリの外を指すシンボリックリンクはツリーに含めない
+                try:
+                    await validate_path(entry.path)
+                except ValueError:
+                    continue
+
+            is_dir = entry.is_dir()
+
+            entry_data: TreeEntry = {
+                "name": entry.name,
+                "type": "directory" if is_dir else "file",
+                "children": [] if is_dir else None,
+            }
+
+            if is_dir:
+                directories.append((entry_data, entry.path))
+
+            result.append(entry_data)
+
+        # サブディレクトリのツリーは並行して構築する
+        children_list = await asyncio.gather(
+            *(build(entry_path) for _, entry_path in directories)
         )
+        for (entry_data, _), children in zip(directories, children_list):
+            entry_data["children"] = children
 
-        if is_dir:
-            entry_data.children = await build_directory_tree(entry_path)
+        return result
 
-        result.append(entry_data)
+    return await build(current_path)
 
-    return result
+
+def dump_json(data: Any) -> str:
+    """インデント付きのJSON文字列に変換する (orjson が利用可能なら使用する)"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode("utf-8")
+    # orjson と同じく非ASCII文字はエスケープせずに出力する
+    return json.dumps(data, indent=2, ensure_ascii=False)
 
 
 # Tool execution functions
+def get_path_argument(arguments: Dict[str, Any]) -> str:
+    """ツール引数から path を取り出す (path のみの引数は pydantic を使わずに検証する)"""
+    path = arguments.get("path")
+    if not isinstance(path, str):
+        # pydantic の ValidationError (ValueError のサブクラス) と同じ扱いになるよう、TypeError にはしない
+        raise ValueError(f"path には文字列を指定してください: {path!r}")  # noqa: TRY004
+    return path
+
+
 async def execute_read_file(arguments: Dict[str, Any]) -> str:
     """ファイルを読み込むツール実行関数"""
-    args = ReadFileArgs.model_validate(arguments)
+    path = get_path_argument(arguments)
     try:
-        valid_path = await validate_path(args.path)
-        f = await asyncio.to_thread(open, valid_path, "r", encoding="utf-8")
-        try:
-            content = await asyncio.to_thread(f.read)
-            return content
-        finally:
-            await asyncio.to_thread(f.close)
+        valid_path = await validate_path(path)
+        return await asyncio.to_thread(read_text_file, valid_path)
     except FileNotFoundError:
         logger.info(
-            f"File not found: {args.path}. Searching for alternatives in allowed directories."
+            f"File not found: {path}. Searching for alternatives in allowed directories."
         )
-        filename_to_search = os.path.basename(args.path)
+        filename_to_search = os.path.basename(path)
         candidate_files = set()
 
         for allowed_dir in allowed_directories:
@@ -463,14 +903,31 @@ async def execute_read_file(arguments: Dict[str, Any]) -> str:
         if candidate_files:
             candidates_str = "\n".join(sorted(list(candidate_files)))
             return (
-                f"ファイル '{args.path}' は見つかりませんでした。\n"
+                f"ファイル '{path}' は見つかりませんでした。\n"
                 f"以下の候補が見つかりました:\n{candidates_str}"
             )
         else:
-            return f"ファイル '{args.path}' は見つからず、他の場所でも候補は見つかりませんでした。"
+            return f"ファイル '{path}' は見つからず、他の場所でも候補は見つかりませんでした。"
     except Exception as e:
-        logger.error(f"Error reading file {args.path}: {e}")
-        return f"ファイル '{args.path}' の読み込み中にエラーが発生しました: {str(e)}"
+        logger.error(f"Error reading file {path}: {e}")
+        return f"ファイル '{path}' の読み込み中にエラーが発生しました: {str(e)}"
+
+
+async def execute_read_multiple_files(arguments: Dict[str, Any]) -> str:
+    """複数のファイルを並行して読み込むツール実行関数"""
+    args = ReadMultipleFilesArgs.model_validate(arguments)
+
+    async def read_one(path: str) -> str:
+        try:
+            valid_path = await validate_path(path)
+            content = await asyncio.to_thread(read_text_file, valid_path)
+            return f"{path}:\n{content}\n"
+        except Exception as e:
+            # 1つのファイルの失敗で他のファイルの結果を失わないよう、エラーも結果に含める
+            return f"{path}: Error - {str(e)}"
+
+    results = await asyncio.gather(*(read_one(path) for path in args.paths))
+    return "\n---\n".join(results)
 
 
 async def execute_write_file(arguments: Dict[str, Any]) -> str:
@@ -484,12 +941,9 @@ async def execute_write_file(arguments: Dict[str, Any]) -> str:
         if not os.path.exists(parent_dir):
             raise FileNotFoundError(f"親ディレクトリが存在しません: {parent_dir}")
 
-        f = await asyncio.to_thread(open, valid_path, "w", encoding="utf-8")
-        try:
-            await asyncio.to_thread(f.write, args.content)
-            return f"ファイル '{args.path}' への書き込みに成功しました。"
-        finally:
-            await asyncio.to_thread(f.close)
+        async with get_file_lock(valid_path):
+            await asyncio.to_thread(write_text_file, valid_path, args.content)
+        return f"ファイル '{args.path}' への書き込みに成功しました。"
     except FileNotFoundError as e:
         logger.info(
             f"File cannot be written: {args.path}. Searching for alternative locations."
@@ -532,26 +986,31 @@ async def execute_edit_file(arguments: Dict[str, Any]) -> str:
     args = EditFileArgs.model_validate(arguments)
     valid_path = await validate_path(args.path)
 
-    edits_as_dicts = [edit.dict() for edit in args.edits]
-    return await apply_file_edits(valid_path, edits_as_dicts, args.dryRun)
+    return await apply_file_edits(valid_path, args.edits, args.dryRun)
 
 
 async def execute_list_directory(arguments: Dict[str, Any]) -> str:
     """ディレクトリの内容を一覧表示するツール実行関数"""
-    args = ListDirectoryArgs.model_validate(arguments)
-    valid_path = await validate_path(args.path)
+    path = get_path_argument(arguments)
+    valid_path = await validate_path(path)
 
-    entries = await asyncio.to_thread(os.listdir, valid_path)
-    formatted = []
+    # 種別の判定もワーカースレッド内で行い、エントリごとのスレッド呼び出しをなくす
+    # (シンボリックリンクは os.path.isdir と同様にリンク先で判定する)
+    entries = await asyncio.to_thread(
+        lambda: [(entry.name, entry.is_dir()) for entry in scan_directory(valid_path)]
+    )
+    validations = await asyncio.gather(
+        *(validate_path(os.path.join(valid_path, name)) for name, _ in entries),
+        return_exceptions=True,
+    )
 
-    for entry in entries:
-        entry_path = os.path.join(valid_path, entry)
-        try:
-            await validate_path(entry_path)
-            is_dir = await asyncio.to_thread(os.path.isdir, entry_path)
-            formatted.append(f"[DIR] {entry}" if is_dir else f"[FILE] {entry}")
-        except ValueError:
+    formatted = []
+    for (name, is_dir), validation in zip(entries, validations):
+        if isinstance(validation, ValueError):
             continue
+        if isinstance(validation, BaseException):
+            raise validation
+        formatted.append(f"[DIR] {name}" if is_dir else f"[FILE] {name}")
 
     return (
         "\n".join(formatted)
@@ -576,210 +1035,236 @@ async def execute_search_files(arguments: Dict[str, Any]) -> str:
 
 async def execute_create_directory(arguments: Dict[str, Any]) -> str:
     """ディレクトリを作成するツール実行関数"""
-    args = CreateDirectoryArgs.model_validate(arguments)
-    valid_path = await validate_path(args.path)
+    path = get_path_argument(arguments)
+    valid_path = await validate_path(path)
 
     await asyncio.to_thread(os.makedirs, valid_path, exist_ok=True)
-    return f"ディレクトリ '{args.path}' の作成に成功しました"
+    return f"ディレクトリ '{path}' の作成に成功しました"
 
 
 async def execute_get_file_info(arguments: Dict[str, Any]) -> str:
     """ファイル情報を取得するツール実行関数"""
-    args = GetFileInfoArgs.model_validate(arguments)
-    valid_path = await validate_path(args.path)
+    path = get_path_argument(arguments)
+    valid_path = await validate_path(path)
 
     info = await get_file_stats(valid_path)
-    return "\n".join(f"{key}: {value}" for key, value in info.dict().items())
+    return "\n".join(
+        f"{key}: {format_timestamp_ns(value) if key in _TIMESTAMP_FIELDS else value}"
+        for key, value in info.items()
+    )
 
 
 async def execute_directory_tree(arguments: Dict[str, Any]) -> str:
     """ディレクトリツリーを取得するツール実行関数"""
-    args = DirectoryTreeArgs.model_validate(arguments)
-    valid_path = await validate_path(args.path)
+    path = get_path_argument(arguments)
+    valid_path = await validate_path(path)
 
     tree_data = await build_directory_tree(valid_path)
-    return json.dumps([entry.dict() for entry in tree_data], indent=2, default=str)
-
-
-def get_filesystem_tools() -> List[Dict[str, Any]]:
-    """ファイルシステム操作ツールのリストを返します"""
-    tools = [
-        {
-            "type": "function",
-            "function": {
-                "name": "read_file",
-                "description": "ファイルシステムからファイルの内容を読み込みます。",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "path": {
-                            "type": "string",
-                            "description": "読み込むファイルのパス",
-                        }
-                    },
-                    "required": ["path"],
+    return dump_json(tree_data)
+
+
+# ファイルシステム操作ツールの定義 (モジュール読み込み時に一度だけ構築する)
+_FILESYSTEM_TOOLS: List[Dict[str, Any]] = [
+    {
+        "type": "function",
+        "function": {
+            "name": "read_file",
+            "description": "ファイルシステムからファイルの内容を読み込みます。",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {
+                        "type": "string",
+                        "description": "読み込むファイルのパス",
+                    }
                 },
+                "required": ["path"],
             },
-            "execute": execute_read_file,
         },
-        {
-            "type": "function",
-            "function": {
-                "name": "write_file",
-                "description": "ファイルシステムにファイルを書き込みます。",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "path": {
-                            "type": "string",
-                            "description": "書き込み先のファイルパス",
-                        },
-                        "content": {
-                            "type": "string",
-                            "description": "ファイルに書き込む内容",
-                        },
+        "execute": execute_read_file,
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "read_multiple_files",
+            "description": "複数のファイルの内容を同時に読み込みます。1つのファイルの読み込みに失敗しても、他のファイルの内容は返されます。",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "paths": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "読み込むファイルのパスのリスト",
+                    }
+                },
+                "required": ["paths"],
+            },
+        },
+        "execute": execute_read_multiple_files,
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "write_file",
+            "description": "ファイルシステムにファイルを書き込みます。",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {
+                        "type": "string",
+                        "description": "書き込み先のファイルパス",
+                    },
+                    "content": {
+                        "type": "string",
+                        "description": "ファイルに書き込む内容",
                     },
-                    "required": ["path", "content"],
                 },
+                "required": ["path", "content"],
             },
-            "execute": execute_write_file,
         },
-        {
-            "type": "function",
-            "function": {
-                "name": "edit_file",
-                "description": "既存ファイルの一部を編集します。",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "path": {
-                            "type": "string",
-                            "description": "編集するファイルのパス",
-                        },
-                        "edits": {
-                            "type": "array",
-                            "items": {
-                                "type": "object",
-                                "properties": {
-                                    "oldText": {
-                                        "type": "string",
-                                        "description": "置換対象のテキスト",
-                                    },
-                                    "newText": {
-                                        "type": "string",
-                                        "description": "新しいテキスト",
-                                    },
+        "execute": execute_write_file,
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "edit_file",
+            "description": "既存ファイルの一部を編集します。",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {
+                        "type": "string",
+                        "description": "編集するファイルのパス",
+                    },
+                    "edits": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "oldText": {
+                                    "type": "string",
+                                    "description": "置換対象のテキスト",
+                                },
+                                "newText": {
+                                    "type": "string",
+                                    "description": "新しいテキスト",
                                 },
-                                "required": ["oldText", "newText"],
                             },
-                            "description": "適用する編集のリスト",
-                        },
-                        "dryRun": {
-                            "type": "boolean",
-                            "description": "TrueならDiffのみ表示し、実際には編集しない",
-                            "default": False,
+                            "required": ["oldText", "newText"],
                         },
+                        "description": "適用する編集のリスト",
+                    },
+                    "dryRun": {
+                        "type": "boolean",
+                        "description": "TrueならDiffのみ表示し、実際には編集しない",
+                        "default": False,
                     },
-                    "required": ["path", "edits"],
                 },
+                "required": ["path", "edits"],
             },
-            "execute": execute_edit_file,
         },
-        {
-            "type": "function",
-            "function": {
-                "name": "list_directory",
-                "description": "ディレクトリ内のファイルとフォルダをリストアップします。",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "path": {
-                            "type": "string",
-                            "description": "リストアップするディレクトリのパス",
-                        }
-                    },
-                    "required": ["path"],
+        "execute": execute_edit_file,
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "list_directory",
+            "description": "ディレクトリ内のファイルとフォルダをリストアップします。",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {
+                        "type": "string",
+                        "description": "リストアップするディレクトリのパス",
+                    }
                 },
+                "required": ["path"],
             },
-            "execute": execute_list_directory,
         },
-        {
-            "type": "function",
-            "function": {
-                "name": "search_files",
-                "description": "パターンに一致するファイルを検索します。",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "path": {
-                            "type": "string",
-                            "description": "検索を開始するディレクトリのパス",
-                        },
-                        "pattern": {"type": "string", "description": "検索パターン"},
-                        "excludePatterns": {
-                            "type": "array",
-                            "items": {"type": "string"},
-                            "description": "除外するパターンのリスト",
-                        },
+        "execute": execute_list_directory,
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "search_files",
+            "description": "パターンに一致するファイルを検索します。",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {
+                        "type": "string",
+                        "description": "検索を開始するディレクトリのパス",
+                    },
+                    "pattern": {"type": "string", "description": "検索パターン"},
+                    "excludePatterns": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "除外するパターンのリスト",
                     },
-                    "required": ["path", "pattern"],
                 },
+                "required": ["path", "pattern"],
             },
-            "execute": execute_search_files,
         },
-        {
-            "type": "function",
-            "function": {
-                "name": "create_directory",
-                "description": "新しいディレクトリを作成します。",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "path": {
-                            "type": "string",
-                            "description": "作成するディレクトリのパス",
-                        }
-                    },
-                    "required": ["path"],
+        "execute": execute_search_files,
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "create_directory",
+            "description": "新しいディレクトリを作成します。",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {
+                        "type": "string",
+                        "description": "作成するディレクトリのパス",
+                    }
                 },
+                "required": ["path"],
             },
-            "execute": execute_create_directory,
         },
-        {
-            "type": "function",
-            "function": {
-                "name": "get_file_info",
-                "description": "ファイルやディレクトリの詳細情報を取得します。",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "path": {
-                            "type": "string",
-                            "description": "情報を取得するファイルまたはディレクトリのパス",
-                        }
-                    },
-                    "required": ["path"],
+        "execute": execute_create_directory,
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_file_info",
+            "description": "ファイルやディレクトリの詳細情報を取得します。",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {
+                        "type": "string",
+                        "description": "情報を取得するファイルまたはディレクトリのパス",
+                    }
                 },
+                "required": ["path"],
             },
-            "execute": execute_get_file_info,
         },
-        {
-            "type": "function",
-            "function": {
-                "name": "directory_tree",
-                "description": "指定されたパスから始まるディレクトリとファイルの再帰的なツリー構造を取得します。",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "path": {
-                            "type": "string",
-                            "description": "ツリーのルートディレクトリ",
-                        }
-                    },
-                    "required": ["path"],
+        "execute": execute_get_file_info,
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "directory_tree",
+            "description": "指定されたパスから始まるディレクトリとファイルの再帰的なツリー構造を取得します。",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {
+                        "type": "string",
+                        "description": "ツリーのルートディレクトリ",
+                    }
                 },
+                "required": ["path"],
             },
-            "execute": execute_directory_tree,
         },
-    ]
-    return tools
+        "execute": execute_directory_tree,
+    },
+]
+
+
+def get_filesystem_tools() -> List[Dict[str, Any]]:
+    """ファイルシステム操作ツールのリストを返します"""
+    # 呼び出し側がリストを変更しても定義に影響しないよう、浅いコピーを返す
+    return list(_FILESYSTEM_TOOLS)
@@ -105,14 +105,12 @@ async def run_litellm_from_cli(args):
     if not prompt:
         if sys.stdin.isatty():
             logger.info("プロンプトを標準入力から読み込みます (Ctrl+D で終了):")
-        lines = []
         try:
-            for line in sys.stdin:
-                lines.append(line.rstrip("\n"))
+            # 行ごとのループではなく一括で読み込み、末尾の改行のみ取り除く
+            prompt = sys.stdin.read().rstrip("\n")
         except KeyboardInterrupt:
             logger.warning("入力が中断されました。")
             return
-        prompt = "\n".join(lines)
         if not prompt.strip():
             logger.error("プロンプトが空です。実行を中止します。")
             return
@@ -1,21 +1,267 @@
 #!/usr/bin/env python3
 
 import asyncio
+import errno
+import os
+import shlex
+import shutil
+import signal
 import sys
-from typing import List, Dict, Any, Optional
+from collections import deque
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
 
 import structlog
+from pydantic import BaseModel, Field
 
 try:
-    from pydantic import BaseModel, Field
-except ImportError:
-    print("Error: pydantic package required. Install with 'pip install pydantic'")
-    sys.exit(1)
+    import fcntl
+except ImportError:  # Windows では利用できない
+    fcntl = None
 
 logger = structlog.get_logger(__name__)
 
 # シェルコマンドの最大出力長。これを超えると丸め処理が行われる。
 MAX_OUTPUT_THRESHOLD = 7500
+# 標準出力・標準エラー出力それぞれについて、先頭と末尾で保持する最大バイト数
+# 出力が非常に大きいコマンドでもメモリ使用量が上限を超えないようにする
+STREAM_CAPTURE_LIMIT = 2 * 1024 * 1024
+# 子プロセスの標準出力・標準エラー出力のパイプに設定するバッファサイズ (Linux のみ)
+# 既定の 64 KiB では出力の多いコマンドが書き込みで頻繁にブロックされる
+PIPE_BUFFER_SIZE = 1024 * 1024
+PIPE_MAX_SIZE_PATH = "/proc/sys/fs/pipe-max-size"
+
+
+@lru_cache(maxsize=1)
+def get_pipe_buffer_size() -> int:
+    """設定するパイプのバッファサイズを、一般ユーザーが設定可能な上限に収めて返す"""
+    try:
+        with open(PIPE_MAX_SIZE_PATH) as f:
+            return min(PIPE_BUFFER_SIZE, int(f.read()))
+    except (OSError, ValueError):
+        return PIPE_BUFFER_SIZE
+
+
+def enlarge_pipe_buffers(transport: asyncio.SubprocessTransport) -> None:
+    """
+    子プロセスの標準出力・標準エラー出力のパイプバッファを拡張する。
+    F_SETPIPE_SZ に対応しない環境や、設定に失敗した場合は既定のサイズのまま続行する。
+    Popen の pipesize 引数と異なり、uvloop など subprocess.Popen を使わないイベントループでも機能する。
+    """
+    if fcntl is None or not hasattr(fcntl, "F_SETPIPE_SZ"):
+        return
+    size = get_pipe_buffer_size()
+    for fd in (1, 2):
+        pipe_transport = transport.get_pipe_transport(fd)
+        # uvloop などのイベントループは "pipe" を提供しない場合があるため、その場合は設定しない
+        pipe = pipe_transport and pipe_transport.get_extra_info("pipe")
+        if pipe is None:
+            continue
+        try:
+            fcntl.fcntl(pipe.fileno(), fcntl.F_SETPIPE_SZ, size)
+        except (OSError, ValueError):
+            pass
+
+
+# これらの文字を含むコマンドはシェルによる解釈 (パイプ、リダイレクト、展開など) が必要
+SHELL_METACHARACTERS = frozenset("|&;<>$`()*?[]{}~#!\\\n")
+# シェルの予約語と組み込みコマンド (同名の実行ファイルがあっても、シェル上とは挙動が異なりうる)
+SHELL_BUILTINS = frozenset(
+    {
+        # 予約語
+        "!",
+        "[[",
+        "]]",
+        "{",
+        "}",
+        "case",
+        "coproc",
+        "do",
+        "done",
+        "elif",
+        "else",
+        "esac",
+        "fi",
+        "for",
+        "function",
+        "if",
+        "in",
+        "select",
+        "then",
+        "time",
+        "until",
+        "while",
+        # 組み込みコマンド
+        ".",
+        ":",
+        "alias",
+        "bg",
+        "bind",
+        "break",
+        "builtin",
+        "caller",
+        "cd",
+        "command",
+        "compgen",
+        "complete",
+        "continue",
+        "declare",
+        "dirs",
+        "disown",
+        "enable",
+        "eval",
+        "exec",
+        "exit",
+        "export",
+        "fc",
+        "fg",
+        "getopts",
+        "hash",
+        "help",
+        "history",
+        "jobs",
+        "let",
+        "local",
+        "logout",
+        "mapfile",
+        "popd",
+        "pushd",
+        "read",
+        "readarray",
+        "readonly",
+        "return",
+        "set",
+        "shift",
+        "shopt",
+        "source",
+        "suspend",
+        "times",
+        "trap",
+        "type",
+        "typeset",
+        "ulimit",
+        "umask",
+        "unalias",
+        "unset",
+        "wait",
+    }
+)
+
+
+@lru_cache(maxsize=256)
+def build_exec_argv(command: str) -> Optional[Tuple[str, ...]]:
+    """
+    シェルを介さずに実行できる単純なコマンドであれば引数のタプルを返す。
+    シェルによる解釈が必要な場合や、PATH 上に実行ファイルが見つからない場合は None を返す。
+    エージェントは同じコマンドを繰り返し実行することが多いため、判定結果をキャッシュする。
+    """
+    if sys.platform == "win32" or not SHELL_METACHARACTERS.isdisjoint(command):
+        return None
+    try:
+        argv = shlex.split(command)
+    except ValueError:  # 引用符の対応が取れていない場合はシェルにエラーを任せる
+        return None
+    if not argv or argv[0] in SHELL_BUILTINS or "=" in argv[0]:
+        return None
+    # パスを含むコマンドはワークスペースからの相対パスやシバンのないスクリプトでありうるため、
+    # PATH から解決できるコマンド名のみを直接実行する
+    if os.sep in argv[0] or shutil.which(argv[0]) is None:
+        return None
+    return tuple(argv)
+
+
+def get_process_group_kwargs() -> Dict[str, Any]:
+    """
+    Unix ではコマンドを新しいセッション (プロセスグループ) で起動し、タイムアウト時にシェルの
+    子孫プロセスもまとめて終了できるようにするための引数を返す。
+    process_group=0 のように制御端末を共有したままバックグラウンドのプロセスグループに置くと、
+    端末から入力を読むコマンドが SIGTTIN で停止し、タイムアウトまで待たされてしまう。
+    そのため制御端末からは切り離し、/dev/tty を開く ssh や sudo、git の認証プロンプトなどは
+    待たされずにすぐ失敗するようにする。
+    """
+    if sys.platform == "win32":
+        return {}
+    return {"start_new_session": True}
+
+
+def signal_process_group(transport: asyncio.SubprocessTransport, force: bool) -> None:
+    """
+    プロセスグループ全体に SIGTERM (force の場合は SIGKILL) を送る。
+    Windows ではプロセスグループを扱わず、直接の子プロセスのみを終了する。
+    """
+    if sys.platform == "win32":
+        if transport.get_returncode() is None:
+            if force:
+                transport.kill()
+            else:
+                transport.terminate()
+        return
+    try:
+        # start_new_session により、プロセスグループ ID は子プロセスの PID と等しい
+        os.killpg(transport.get_pid(), signal.SIGKILL if force else signal.SIGTERM)
+    except ProcessLookupError:  # グループ内のプロセスが既にすべて終了している
+        pass
+
+
+class OutputCapture:
+    """
+    ストリームの先頭と末尾の最大 limit バイトずつを保持するバッファ。
+    間を省略した場合は、省略したバイト数を示す行を挟んで返す。
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.head = bytearray()
+        self.tail: deque[bytes] = deque()
+        self.tail_size = 0
+        self.total_size = 0
+
+    def feed(self, chunk: bytes) -> None:
+        self.total_size += len(chunk)
+        if len(self.head) < self.limit:
+            remaining = self.limit - len(self.head)
+            self.head += chunk[:remaining]
+            chunk = chunk[remaining:]
+        if chunk:
+            self.tail.append(chunk)
+            self.tail_size += len(chunk)
+            # 末尾の limit バイトに不要なチャンクだけを捨てる (チャンク単位で捨てるため O(1))
+            while self.tail_size - len(self.tail[0]) >= self.limit:
+                self.tail_size -= len(self.tail.popleft())
+
+    def getvalue(self) -> bytes:
+        tail_bytes = b"".join(self.tail)[-self.limit :]
+        omitted_size = self.total_size - len(self.head) - len(tail_bytes)
+        if omitted_size > 0:
+            marker = f"\n... ({omitted_size} バイト省略) ...\n".encode()
+            return bytes(self.head) + marker + tail_bytes
+        return bytes(self.head) + tail_bytes
+
+
+class ShellCommandProtocol(asyncio.SubprocessProtocol):
+    """
+    子プロセスの標準出力・標準エラー出力を直接バッファに蓄えるプロトコル。
+    StreamReader を介さないため、チャンクごとのキューやFutureの受け渡しが発生しない。
+    """
+
+    def __init__(self, limit: int):
+        loop = asyncio.get_running_loop()
+        self.outputs = {1: OutputCapture(limit), 2: OutputCapture(limit)}
+        # 子プロセス自体の終了
+        self.exited = loop.create_future()
+        # 子プロセスが終了し、かつすべてのパイプが閉じられた (出力を受信しきった)
+        self.finished = loop.create_future()
+
+    def pipe_data_received(self, fd: int, data: bytes) -> None:
+        self.outputs[fd].feed(data)
+
+    def process_exited(self) -> None:
+        if not self.exited.done():
+            self.exited.set_result(None)
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        if not self.finished.done():
+            self.finished.set_result(None)
 
 
 # スキーマ定義
@@ -36,55 +282,103 @@ async def execute_shell_command_async(arguments: Dict[str, Any]) -> str:
     try:
         args = ShellCommandArgs.model_validate(arguments)
     except Exception as e:
+        # ValidationError の文字列化は全エラーを整形するため、一度だけ行う
+        error = str(e)
         logger.error(
-            "シェルコマンド引数の検証に失敗しました", error=str(e), arguments=arguments
+            "シェルコマンド引数の検証に失敗しました", error=error, arguments=arguments
         )
-        return f"引数エラー: {str(e)}"
+        return f"引数エラー: {error}"
+
+    # 何度も参照する値はローカル変数に束縛しておく
+    command = args.command
+    workspace = args.workspace
+    workspace_label = workspace or "カレントディレクトリ"
 
     logger.info(
         "シェルコマンドを実行します",
-        command=args.command,
+        command=command,
         timeout=args.timeout,
-        workspace=args.workspace or "カレントディレクトリ",
+        workspace=workspace_label,
     )
 
+    loop = asyncio.get_running_loop()
+    transport: Optional[asyncio.SubprocessTransport] = None
     try:
-        # asyncio.create_subprocess_shell を使用してコマンドを実行
-        process = await asyncio.create_subprocess_shell(
-            args.command,
+        # エージェントはコマンドに入力を渡せないため、標準入力は空にして入力待ちで止まらないようにする
+        subprocess_kwargs = dict(
+            stdin=asyncio.subprocess.DEVNULL,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
-            cwd=args.workspace,  # ワークスペースを指定
+            cwd=workspace,  # ワークスペースを指定
+            **get_process_group_kwargs(),
         )
+        # 単純なコマンドはシェルを起動せずに直接実行し、プロセス生成を 1 つ減らす
+        argv = build_exec_argv(command)
+        if argv is not None:
+            try:
+                transport, protocol = await loop.subprocess_exec(
+                    lambda: ShellCommandProtocol(STREAM_CAPTURE_LIMIT),
+                    *argv,
+                    **subprocess_kwargs,
+                )
+            except OSError as e:
+                # 判定後に実行ファイルが削除された場合やシバンのないスクリプトはシェルで実行する
+                # (ワークスペースが存在しない場合は、シェルでも同じエラーになる)
+                if not isinstance(e, FileNotFoundError) and e.errno != errno.ENOEXEC:
+                    raise
+        if transport is None:
+            transport, protocol = await loop.subprocess_shell(
+                lambda: ShellCommandProtocol(STREAM_CAPTURE_LIMIT),
+                command,
+                **subprocess_kwargs,
+            )
+        enlarge_pipe_buffers(transport)
 
-        # タイムアウト付きで待機
-        stdout, stderr = await asyncio.wait_for(
-            process.communicate(), timeout=args.timeout
-        )
+        # タイムアウト付きで、プロセスの終了と出力の受信完了を待つ
+        # 出力はイベントループがパイプを読むたびにプロトコルのバッファへ蓄積される
+        async with asyncio.timeout(args.timeout):
+            await protocol.finished
+        returncode = transport.get_returncode()
+        stdout = protocol.outputs[1].getvalue()
+        stderr = protocol.outputs[2].getvalue()
+
+        # デコードは一度だけ行い、出力の組み立てとログで共有する
+        stdout_text = stdout.decode(errors="replace")
+        stderr_text = stderr.decode(errors="replace")
 
-        output = ""
-        if stdout:
-            output += f"Stdout:\n{stdout.decode(errors='replace')}\n"
-        if stderr:
-            output += f"Stderr:\n{stderr.decode(errors='replace')}\n"
+        # 出力が大きい場合に文字列の連結で何度もコピーしないよう、最後に一度だけ結合する
+        output_parts: List[str] = []
+        if stdout_text:
+            output_parts += ("Stdout:\n", stdout_text, "\n")
+        if stderr_text:
+            output_parts += ("Stderr:\n", stderr_text, "\n")
 
-        if process.returncode != 0:
-            output += f"Return code: {process.returncode}\n"
+        if returncode != 0:
+            output_parts.append(f"Return code: {returncode}\n")
             logger.warning(
                 "シェルコマンドがエラーで終了しました",
-                command=args.command,
-                workspace=args.workspace or "カレントディレクトリ",
-                return_code=process.returncode,
-                stdout=stdout.decode(errors="replace"),
-                stderr=stderr.decode(errors="replace"),
+                command=command,
+                workspace=workspace_label,
+                return_code=returncode,
+                stdout_length=len(stdout_text),
+                stderr_length=len(stderr_text),
+            )
+            # 数 MB になりうる出力そのものは DEBUG レベルでのみ出力する
+            # (レベル未満のログ呼び出しは何もしないため、通常は整形・出力のコストがかからない)
+            logger.debug(
+                "エラーで終了したシェルコマンドの出力",
+                command=command,
+                stdout=stdout_text,
+                stderr=stderr_text,
             )
         else:
             logger.info(
                 "シェルコマンドの実行に成功しました",
-                command=args.command,
-                workspace=args.workspace or "カレントディレクトリ",
-                return_code=process.returncode,
+                command=command,
+                workspace=workspace_label,
+                return_code=returncode,
             )
+        output = "".join(output_parts)
 
         # 出力を丸める処理
         # 実際の出力は truncate_part_length + 省略記号 + truncate_part_length となるため、
@@ -109,7 +403,7 @@ async def execute_shell_command_async(arguments: Dict[str, Any]) -> str:
 
             logger.info(
                 "シェルコマンドの出力が長すぎるため丸められました",
-                command=args.command,
+                command=command,
                 original_length=original_output_length,
                 truncated_length=len(output),  # 丸め後の実際の長さ
                 max_threshold=MAX_OUTPUT_THRESHOLD,
@@ -117,74 +411,86 @@ async def execute_shell_command_async(arguments: Dict[str, Any]) -> str:
 
         return output if output else "コマンドは出力を生成しませんでした。"
 
-    except asyncio.TimeoutError:
+    except TimeoutError:
         logger.error(
             "シェルコマンドがタイムアウトしました",
-            command=args.command,
+            command=command,
             timeout=args.timeout,
-            workspace=args.workspace or "カレントディレクトリ",
+            workspace=workspace_label,
         )
-        # タイムアウトした場合、プロセスを強制終了しようと試みる
-        if process and process.returncode is None:
+        # タイムアウトした場合、プロセスグループごと終了させる
+        # シェル自体が終了していても、子孫プロセスがパイプを保持したまま残っている場合がある
+        try:
+            signal_process_group(transport, force=False)
             try:
-                process.terminate()
-                await asyncio.wait_for(process.wait(), timeout=5)  # terminate後の待機
-            except asyncio.TimeoutError:
-                process.kill()  # terminateが効かなければkill
-                await process.wait()
-            except Exception as e_kill:
-                logger.error(
-                    "タイムアウトしたプロセスの終了中にエラー", error=str(e_kill)
-                )
-        return f"コマンド '{args.command}' がタイムアウトしました ({args.timeout}秒)。"
+                # タイムアウトでキャンセルされるのは shield 側だけで、exited 自体は後で再度待てる
+                async with asyncio.timeout(5):  # terminate後の待機
+                    await asyncio.shield(protocol.exited)
+            except TimeoutError:
+                pass
+            # terminateが効かないプロセスや、残った子孫プロセスはkillする
+            signal_process_group(transport, force=True)
+            await protocol.exited
+        except Exception as e_kill:
+            logger.error("タイムアウトしたプロセスの終了中にエラー", error=str(e_kill))
+        return f"コマンド '{command}' がタイムアウトしました ({args.timeout}秒)。"
     except FileNotFoundError:
         logger.error(
             "シェルコマンドの実行に失敗しました: コマンドまたはワークスペースが見つかりません",
-            command=args.command,
-            workspace=args.workspace,
+            command=command,
+            workspace=workspace,
         )
-        if args.workspace:
-            return f"コマンド '{args.command}' の実行に失敗しました。コマンドまたはワークスペース '{args.workspace}' が見つかりません。パスを確認してください。"
-        return f"コマンド '{args.command}' が見つかりません。パスを確認してください。"
+        if workspace:
+            return f"コマンド '{command}' の実行に失敗しました。コマンドまたはワークスペース '{workspace}' が見つかりません。パスを確認してください。"
+        return f"コマンド '{command}' が見つかりません。パスを確認してください。"
     except Exception as e:
+        error = str(e)
         logger.error(
             "シェルコマンドの実行中に予期せぬエラーが発生しました",
-            command=args.command,
-            workspace=args.workspace or "カレントディレクトリ",
-            error=str(e),
+            command=command,
+            workspace=workspace_label,
+            error=error,
         )
-        return f"コマンド '{args.command}' の実行中にエラーが発生しました: {str(e)}"
+        return f"コマンド '{command}' の実行中にエラーが発生しました: {error}"
+    finally:
+        # パイプを閉じてトランスポートを解放する (子プロセスが残っていれば kill される)
+        if transport is not None:
+            transport.close()
 
 
-def get_shell_command_tools() -> List[Dict[str, Any]]:
-    """シェルコマンド操作ツールのリストを返します"""
-    tools = [
-        {
-            "type": "function",
-            "function": {
-                "name": "execute_shell_command",
-                "description": "指定されたシェルコマンドを実行し、標準出力と標準エラー出力を返します。セキュリティリスクを伴うため、注意して使用してください。",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "command": {
-                            "type": "string",
-                            "description": "実行する完全なシェルコマンド文字列。",
-                        },
-                        "timeout": {
-                            "type": "integer",
-                            "description": "コマンドがタイムアウトするまでの秒数。デフォルトは60秒。",
-                            "default": 60,
-                        },
-                        "workspace": {
-                            "type": "string",
-                            "description": "コマンドを実行するワークスペースディレクトリ。指定しない場合はカレントディレクトリで実行されます。",
-                        },
+# ツール定義は呼び出しごとに変わらないため、モジュール読み込み時に一度だけ構築する
+_SHELL_COMMAND_TOOLS: List[Dict[str, Any]] = [
+    {
+        "type": "function",
+        "function": {
+            "name": "execute_shell_command",
+            "description": "指定されたシェルコマンドを実行し、標準出力と標準エラー出力を返します。セキュリティリスクを伴うため、注意して使用してください。",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "command": {
+                        "type": "string",
+                        "description": "実行する完全なシェルコマンド文字列。",
+                    },
+                    "timeout": {
+                        "type": "integer",
+                        "description": "コマンドがタイムアウトするまでの秒数。デフォルトは60秒。",
+                        "default": 60,
+                    },
+                    "workspace": {
+                        "type": "string",
+                        "description": "コマンドを実行するワークスペースディレクトリ。指定しない場合はカレントディレクトリで実行されます。",
                     },
-                    "required": ["command"],
                 },
+                "required": ["command"],
             },
-            "execute": execute_shell_command_async,
-        }
-    ]
-    return tools
+        },
+        "execute": execute_shell_command_async,
+    }
+]
+
+
+def get_shell_command_tools() -> List[Dict[str, Any]]:
+    """シェルコマンド操作ツールのリストを返します"""
+    # 呼び出し側がリストを変更しても定義に影響しないよう、浅いコピーを返す
+    return list(_SHELL_COMMAND_TOOLS)
@@ -1,4 +1,4 @@
-from textutil import han2zen
+from textutil import han2zen, han2zen_many
 
 
 def test_han2zen():
@@ -10,3 +10,10 @@ def test_han2zen():
         query_zen
         == "！＂＃＄％＆＇（）＊＋，－．／０１２３４５６７８９：；＜＝＞？＠ＡＢＣＤＥＦＧＨＩＪＫＬＭＮＯＰＱＲＳＴＵＶＷＸＹＺ［＼］＾＿｀ａｂｃｄｅｆｇｈｉｊｋｌｍｎｏｐｑｒｓｔｕｖｗｘｙｚ｛｜｝～"
     )
+
+
+def test_han2zen_many():
+    "han to zen for multiple queries"
+    queries = ["abc", "", "あ1\n", "(x)"]
+    assert han2zen_many(queries) == [han2zen(query) for query in queries]
+    assert han2zen_many([]) == []
@@ -1,9 +1,23 @@
-ZEN = "".join(chr(0xFF01 + i) for i in range(94))
-HAN = "".join(chr(0x21 + i) for i in range(94))
-HAN2ZEN = str.maketrans(HAN, ZEN)
+# 半角の ASCII 印字可能文字 (0x21-0x7E) を全角 (0xFF01-0xFF5E) へ対応付ける変換表
+# str.translate は整数のコードポイントをキーとする辞書をそのまま使える
+HAN2ZEN = {code: code + 0xFEE0 for code in range(0x21, 0x21 + 94)}
 
 
 # 半角から全角
 def han2zen(query: str) -> str:
     # 半角から全角
     return query.translate(HAN2ZEN)
+
+
+# 複数の文字列をまとめて半角から全角
+def han2zen_many(queries: list[str]) -> list[str]:
+    # 変換は 1 文字ずつの置換で長さが変わらないため、連結して一度だけ translate し、
+    # 元の長さで切り分ける (文字列ごとに translate を呼ぶオーバーヘッドを省く)
+    translated = "".join(queries).translate(HAN2ZEN)
+    results = []
+    start = 0
+    for query in queries:
+        end = start + len(query)
+        results.append(translated[start:end])
+        start = end
+    return results
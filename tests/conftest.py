@@ -0,0 +1,10 @@
+import os
+
+# litellm は import 時にモデル価格表をネットワークから取得し、失敗すると別スレッドで再試行する。
+# その再試行スレッドが import 中の litellm を import しようとして _DeadlockError になることがあるため、
+# テストではローカルの価格表を使う。
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+# llm_coder.agent は litellm を遅延 import するため、最初の import が
+# patch("litellm.acompletion") の中で起きないよう、テスト収集前に一度 import しておく
+import litellm  # noqa: E402, F401
@@ -1,13 +1,22 @@
+import asyncio
 import pytest
-from unittest.mock import patch, AsyncMock
+from unittest.mock import patch, AsyncMock, MagicMock
 import json
 import sys
 import os
 from typing import Dict, Any, List
 
+import litellm
+
 # テスト対象のモジュールをインポート
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from llm_coder.agent import Agent, Message
+from llm_coder.agent import (
+    COMPLETION_CHECK_PROMPT,
+    SYSTEM_PROMPT,
+    Agent,
+    Message,
+    extract_summary,
+)
 
 
 # モック用のレスポンスクラス群
@@ -386,3 +395,430 @@ async def test_get_messages_for_llm(mock_tools):
     assert any(
         "テストファイルの内容です" in msg.get("content", "") for msg in tool_responses
     ), "ツール応答の内容が正しくありません"
+
+
+def test_message_to_dict_is_cached():
+    """Message.to_dict が辞書をキャッシュし、同じオブジェクトを返すか検証する"""
+    message = Message(
+        role="tool", content="結果", tool_call_id="call_1", name="read_file"
+    )
+
+    first = message.to_dict()
+    second = message.to_dict()
+
+    assert first == {
+        "role": "tool",
+        "content": "結果",
+        "tool_call_id": "call_1",
+        "name": "read_file",
+    }
+    assert first is second
+
+
+# 1ターン内の複数ツール呼び出しの並行実行テスト
+@pytest.mark.asyncio
+@patch("litellm.acompletion")
+async def test_parallel_tool_calls_in_single_turn(mock_acompletion):
+    """1つのアシスタントメッセージ内の複数ツール呼び出しが並行実行され、順序が保たれるか検証する"""
+    in_flight = 0
+    max_in_flight = 0
+
+    async def slow_read(arguments: Dict[str, Any]) -> str:
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.05)
+        in_flight -= 1
+        return f"内容: {arguments['path']}"
+
+    tools = [
+        {
+            "type": "function",
+            "function": {
+                "name": "read_file",
+                "description": "ファイルの内容を読み込む",
+                "parameters": {
+                    "type": "object",
+                    "properties": {"path": {"type": "string"}},
+                    "required": ["path"],
+                },
+            },
+            "execute": slow_read,
+        }
+    ]
+
+    plan_response = MockResponse(
+        id="mock-plan-parallel",
+        choices_data=[
+            {
+                "message": {
+                    "content": "3つのファイルを同時に読み込みます",
+                    "tool_calls": [
+                        {
+                            "id": f"call_{i}",
+                            "function": {
+                                "name": "read_file",
+                                "arguments": json.dumps({"path": f"file{i}.txt"}),
+                            },
+                        }
+                        for i in range(3)
+                    ],
+                }
+            }
+        ],
+    )
+    complete_response = MockResponse(
+        id="mock-complete-parallel",
+        choices_data=[{"message": {"content": "TASK_COMPLETE", "tool_calls": None}}],
+    )
+    summary_response = MockResponse(
+        id="mock-summary-parallel",
+        choices_data=[{"message": {"content": "3つのファイルを読み込みました"}}],
+    )
+    mock_acompletion.side_effect = [plan_response, complete_response, summary_response]
+
+    agent = Agent(model="mock-model", max_iterations=3, available_tools=tools)
+    result = await agent.run("3つのファイルを読み込んでください")
+
+    assert result == "3つのファイルを読み込みました"
+    assert max_in_flight == 3
+
+    tool_messages = [m for m in agent.conversation_history if m.role == "tool"]
+    assert [m.tool_call_id for m in tool_messages] == ["call_0", "call_1", "call_2"]
+    assert [m.content for m in tool_messages] == [
+        "内容: file0.txt",
+        "内容: file1.txt",
+        "内容: file2.txt",
+    ]
+
+
+# 同一ターン内の書き込み系ツール呼び出しの逐次実行テスト
+@pytest.mark.asyncio
+@patch("litellm.acompletion")
+async def test_same_file_edits_in_single_turn(mock_acompletion, tmp_path):
+    """1つのアシスタントメッセージ内で同じファイルを編集しても、すべての編集が反映されるか検証する"""
+    from llm_coder.filesystem import (
+        get_filesystem_tools,
+        initialize_filesystem_settings,
+    )
+
+    target = tmp_path / "sample.py"
+    target.write_text("a = 1\nb = 2\n", encoding="utf-8")
+    initialize_filesystem_settings([str(tmp_path)])
+
+    edits = [("a = 1", "a = 10"), ("b = 2", "b = 20")]
+    plan_response = MockResponse(
+        id="mock-plan-edits",
+        choices_data=[
+            {
+                "message": {
+                    "content": "2箇所を編集します",
+                    "tool_calls": [
+                        {
+                            "id": f"call_{i}",
+                            "function": {
+                                "name": "edit_file",
+                                "arguments": json.dumps(
+                                    {
+                                        "path": str(target),
+                                        "edits": [
+                                            {"oldText": old_text, "newText": new_text}
+                                        ],
+                                    }
+                                ),
+                            },
+                        }
+                        for i, (old_text, new_text) in enumerate(edits)
+                    ],
+                }
+            }
+        ],
+    )
+    complete_response = MockResponse(
+        id="mock-complete-edits",
+        choices_data=[{"message": {"content": "TASK_COMPLETE", "tool_calls": None}}],
+    )
+    summary_response = MockResponse(
+        id="mock-summary-edits",
+        choices_data=[{"message": {"content": "2箇所を編集しました"}}],
+    )
+    mock_acompletion.side_effect = [plan_response, complete_response, summary_response]
+
+    agent = Agent(
+        model="mock-model", max_iterations=3, available_tools=get_filesystem_tools()
+    )
+    await agent.run("a と b を変更してください")
+
+    assert target.read_text(encoding="utf-8") == "a = 10\nb = 20\n"
+
+
+# 完了センチネルによる確認往復の省略テスト
+@pytest.mark.asyncio
+@patch("litellm.acompletion")
+async def test_in_band_completion_marker_skips_completion_check(
+    mock_acompletion, mock_tools
+):
+    """ツール呼び出しなしの応答に TASK_COMPLETE が含まれる場合、完了確認のリクエストを送らないか検証する"""
+    plan_response = MockResponse(
+        id="mock-plan-marker",
+        choices_data=[
+            {
+                "message": {
+                    "content": "対応は不要です。TASK_COMPLETE",
+                    "tool_calls": None,
+                }
+            }
+        ],
+    )
+    summary_response = MockResponse(
+        id="mock-summary-marker",
+        choices_data=[{"message": {"content": "何も変更していません"}}],
+    )
+    mock_acompletion.side_effect = [plan_response, summary_response]
+
+    agent = Agent(model="mock-model", max_iterations=3, available_tools=mock_tools)
+    result = await agent.run("何もしないでください")
+
+    assert result == "何も変更していません"
+    # 計画フェーズと最終要約の2回のみ (完了確認の往復なし)
+    assert mock_acompletion.call_count == 2
+    assert all(
+        msg.content != COMPLETION_CHECK_PROMPT for msg in agent.conversation_history
+    )
+
+
+# 完了メッセージ内の要約による最終要約リクエストの省略テスト
+@pytest.mark.asyncio
+@patch("litellm.acompletion")
+async def test_in_band_summary_skips_final_summary_request(
+    mock_acompletion, mock_tools
+):
+    """完了メッセージに要約セクションが含まれる場合、最終要約のリクエストを送らないか検証する"""
+    plan_response = MockResponse(
+        id="mock-plan-summary",
+        choices_data=[
+            {
+                "message": {
+                    "content": "ファイルを読み込みます",
+                    "tool_calls": [
+                        {
+                            "id": "call_1",
+                            "function": {
+                                "name": "read_file",
+                                "arguments": json.dumps({"path": "test.txt"}),
+                            },
+                        }
+                    ],
+                }
+            }
+        ],
+    )
+    complete_response = MockResponse(
+        id="mock-complete-summary",
+        choices_data=[
+            {
+                "message": {
+                    "content": "TASK_COMPLETE\n## 要約\ntest.txt を読み込みました。",
+                    "tool_calls": None,
+                }
+            }
+        ],
+    )
+    mock_acompletion.side_effect = [plan_response, complete_response]
+
+    agent = Agent(model="mock-model", max_iterations=3, available_tools=mock_tools)
+    result = await agent.run("test.txtファイルを読み込んでください")
+
+    assert result == "test.txt を読み込みました。"
+    # 計画フェーズと実行フェーズの2回のみ (最終要約の往復なし)
+    assert mock_acompletion.call_count == 2
+
+
+def test_extract_summary():
+    """extract_summary が要約セクションのみを取り出すか検証する"""
+    assert extract_summary(None) is None
+    assert extract_summary("TASK_COMPLETE") is None
+    assert extract_summary("## 要約\nTASK_COMPLETE") is None
+    assert extract_summary("完了です\n## 要約\n変更点A\nTASK_COMPLETE") == "変更点A"
+
+
+# ストリーミング受信のテスト
+@pytest.mark.asyncio
+@patch("litellm.acompletion")
+async def test_run_with_streaming(mock_acompletion, mock_tools):
+    """stream=True の場合にチャンクを集約し、本文の差分を stream_handler に渡すか検証する"""
+    from litellm.types.utils import Delta, ModelResponseStream, StreamingChoices
+
+    contents = ["作業は不要です。", "TASK_COMPLETE\n", "## 要約\n", "変更なし"]
+
+    async def stream_response():
+        for i, content in enumerate(contents):
+            yield ModelResponseStream(
+                id="mock-stream-1",
+                model="gpt-4.1-nano",
+                choices=[
+                    StreamingChoices(
+                        delta=Delta(content=content),
+                        finish_reason="stop" if i == len(contents) - 1 else None,
+                    )
+                ],
+            )
+
+    mock_acompletion.return_value = stream_response()
+
+    received: List[str] = []
+    agent = Agent(
+        model="gpt-4.1-nano",
+        max_iterations=3,
+        available_tools=mock_tools,
+        stream=True,
+        stream_handler=received.append,
+    )
+    result = await agent.run("何もしないでください")
+
+    assert result == "変更なし"
+    assert received == contents
+    assert mock_acompletion.call_count == 1
+    assert mock_acompletion.call_args[1]["stream"] is True
+
+
+@pytest.mark.asyncio
+@patch("litellm.acompletion")
+async def test_run_with_empty_stream(mock_acompletion, mock_tools):
+    """ストリーミングでチャンクを1つも受信できない場合は APIError を送出するか検証する"""
+
+    async def empty_stream():
+        return
+        yield
+
+    mock_acompletion.return_value = empty_stream()
+
+    agent = Agent(
+        model="gpt-4.1-nano",
+        max_iterations=3,
+        available_tools=mock_tools,
+        stream=True,
+    )
+    with pytest.raises(litellm.exceptions.APIError):
+        await agent.run("何もしないでください")
+
+
+@pytest.mark.asyncio
+async def test_get_messages_for_llm_limits_history(mock_tools):
+    """max_history_messages を超える古い履歴を除外し、孤立したツール結果を含めないか検証する"""
+    agent = Agent(
+        model="test-model",
+        available_tools=mock_tools,
+        max_history_messages=5,
+    )
+    agent.conversation_history = [
+        Message(role="system", content="システム"),
+        Message(role="user", content="タスク"),
+    ]
+    for i in range(10):
+        agent.conversation_history.append(
+            Message(
+                role="assistant",
+                content=f"読み込み{i}",
+                tool_calls=[{"id": f"call_{i}", "function": {"name": "read_file"}}],
+            )
+        )
+        agent.conversation_history.append(
+            Message(role="tool", tool_call_id=f"call_{i}", content=f"結果{i}")
+        )
+
+    messages = await agent._get_messages_for_llm()
+
+    # 直近3件は [tool8, assistant9, tool9] だが、先頭の孤立した tool8 は除外される
+    assert [msg["content"] for msg in messages] == [
+        "システム",
+        "タスク",
+        "読み込み9",
+        "結果9",
+    ]
+    # 会話履歴そのものは切り詰めない
+    assert len(agent.conversation_history) == 22
+
+
+@pytest.mark.asyncio
+@patch("litellm.token_counter", return_value=10)
+async def test_get_messages_for_llm_caches_token_counts(mock_token_counter, mock_tools):
+    """トークン数をメッセージごとに一度だけ計算し、再利用するか検証する"""
+    agent = Agent(
+        model="test-model",
+        available_tools=mock_tools,
+        max_input_tokens=1000,
+    )
+    agent.conversation_history = [
+        Message(role="system", content="システム"),
+        Message(role="user", content="タスク"),
+        Message(role="assistant", content="応答"),
+    ]
+
+    await agent._get_messages_for_llm()
+    assert mock_token_counter.call_count == 3
+
+    # 2回目の呼び出しでは新しいメッセージのみ計算される
+    agent.conversation_history.append(Message(role="user", content="追加"))
+    messages = await agent._get_messages_for_llm()
+    assert mock_token_counter.call_count == 4
+    assert len(messages) == 4
+
+
+@pytest.mark.asyncio
+@patch("litellm.acompletion")
+async def test_prompt_caching(mock_acompletion, mock_tools):
+    """システムプロンプトが不変部分から始まり、キャッシュ指定がリクエストに含まれるか検証する"""
+    complete_response = MockResponse(
+        id="mock-cache",
+        choices_data=[
+            {"message": {"content": "TASK_COMPLETE\n## 要約\n完了", "tool_calls": None}}
+        ],
+    )
+    mock_acompletion.return_value = complete_response
+
+    agent = Agent(
+        model="mock-model",
+        available_tools=mock_tools,
+        repository_description_prompt="テスト用リポジトリ",
+    )
+    await agent.run("タスク")
+
+    system_content = mock_acompletion.call_args[1]["messages"][0]["content"]
+    assert system_content.startswith(SYSTEM_PROMPT)
+    assert system_content.endswith("テスト用リポジトリ\n---")
+    assert mock_acompletion.call_args[1]["cache_control_injection_points"] == [
+        {"location": "message", "role": "system"}
+    ]
+
+    agent = Agent(model="mock-model", available_tools=mock_tools, prompt_caching=False)
+    await agent.run("タスク")
+    assert "cache_control_injection_points" not in mock_acompletion.call_args[1]
+
+
+@pytest.mark.asyncio
+@patch("litellm.acompletion")
+async def test_run_with_router(mock_acompletion, mock_tools):
+    """router が指定された場合、litellm.acompletion ではなく Router 経由でリクエストするか検証する"""
+    router = MagicMock()
+    router.acompletion = AsyncMock(
+        return_value=MockResponse(
+            id="mock-router",
+            choices_data=[
+                {
+                    "message": {
+                        "content": "TASK_COMPLETE\n## 要約\nRouter 経由で完了",
+                        "tool_calls": None,
+                    }
+                }
+            ],
+        )
+    )
+
+    agent = Agent(model="model-group", available_tools=mock_tools, router=router)
+    result = await agent.run("タスク")
+
+    assert result == "Router 経由で完了"
+    assert router.acompletion.call_count == 1
+    assert router.acompletion.call_args[1]["model"] == "model-group"
+    mock_acompletion.assert_not_called()
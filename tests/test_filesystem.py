@@ -0,0 +1,422 @@
+import asyncio
+import os
+from datetime import datetime
+
+import pytest
+
+from llm_coder.filesystem import (
+    EditOperation,
+    apply_edits_sequentially,
+    apply_file_edits,
+    apply_literal_edits_in_one_pass,
+    build_directory_tree,
+    create_unified_diff,
+    execute_edit_file,
+    execute_get_file_info,
+    execute_list_directory,
+    execute_read_file,
+    execute_read_multiple_files,
+    execute_write_file,
+    initialize_filesystem_settings,
+    read_text_file,
+    search_files,
+    validate_path,
+)
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    """許可ディレクトリとして設定したテスト用のディレクトリ構成を提供するフィクスチャ"""
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "main.py").write_text("print('main')\n", encoding="utf-8")
+    (tmp_path / "src" / "util.py").write_text("", encoding="utf-8")
+    (tmp_path / "build").mkdir()
+    (tmp_path / "build" / "main.py").write_text("", encoding="utf-8")
+    (tmp_path / "README.md").write_text("", encoding="utf-8")
+    initialize_filesystem_settings([str(tmp_path)])
+    return tmp_path
+
+
+@pytest.mark.asyncio
+async def test_search_files_with_exclude_patterns(workspace):
+    """除外パターンにエントリ名または相対パスが一致するものを検索対象から外すか検証する"""
+    results = await search_files(str(workspace), "main", ["build"])
+    assert results == [str(workspace / "src" / "main.py")]
+
+    results = await search_files(str(workspace), ".py", ["src/util*"])
+    assert sorted(results) == [
+        str(workspace / "build" / "main.py"),
+        str(workspace / "src" / "main.py"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_search_files_exact_match(workspace):
+    """exact_match 指定時はファイル名が完全一致するもののみ返すか検証する"""
+    results = await search_files(str(workspace), "README.md", exact_match=True)
+    assert results == [str(workspace / "README.md")]
+
+    results = await search_files(str(workspace), "README", exact_match=True)
+    assert results == []
+
+
+@pytest.mark.asyncio
+async def test_build_directory_tree(workspace):
+    """ディレクトリとファイルを区別した再帰的なツリーを構築するか検証する"""
+    tree = await build_directory_tree(str(workspace))
+    entries = {entry["name"]: entry for entry in tree}
+
+    assert set(entries) == {"src", "build", "README.md"}
+    assert entries["README.md"] == {
+        "name": "README.md",
+        "type": "file",
+        "children": None,
+    }
+    assert entries["src"]["type"] == "directory"
+    assert sorted(child["name"] for child in entries["src"]["children"]) == [
+        "main.py",
+        "util.py",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_validate_path_requires_directory_boundary(tmp_path):
+    """許可ディレクトリと同じ接頭辞を持つだけの兄弟ディレクトリを拒否するか検証する"""
+    allowed = tmp_path / "foo"
+    sibling = tmp_path / "foobar"
+    nested = allowed / "sub"
+    nested.mkdir(parents=True)
+    sibling.mkdir()
+    # 他の許可ディレクトリ配下にあるディレクトリを含めても判定できること
+    initialize_filesystem_settings([str(allowed), str(nested)])
+
+    assert await validate_path(str(allowed)) == str(allowed)
+    assert await validate_path(str(nested / "a.txt")) == str(nested / "a.txt")
+    with pytest.raises(ValueError):
+        await validate_path(str(sibling / "a.txt"))
+    with pytest.raises(ValueError):
+        await validate_path(str(tmp_path))
+
+
+@pytest.mark.asyncio
+async def test_validate_path_rechecks_replaced_symlink(workspace, tmp_path_factory):
+    """検証済みのパスが許可ディレクトリ外へのシンボリックリンクに置き換えられたら拒否するか検証する"""
+    target = workspace / "src" / "main.py"
+    assert await validate_path(str(target)) == str(target)
+
+    outside = tmp_path_factory.mktemp("outside") / "secret.txt"
+    outside.write_text("secret", encoding="utf-8")
+    target.unlink()
+    target.symlink_to(outside)
+
+    with pytest.raises(ValueError):
+        await validate_path(str(target))
+
+
+@pytest.mark.asyncio
+async def test_apply_file_edits_multiple_literal_edits(tmp_path):
+    """複数の完全一致する編集をまとめて適用し、差分を返すか検証する"""
+    target = tmp_path / "sample.py"
+    target.write_text(
+        "def add(a, b):\n    return a + b\n\n\ndef sub(a, b):\n    return a - b\n",
+        encoding="utf-8",
+    )
+    edits = [
+        EditOperation(
+            oldText="def add(a, b):", newText="def add(a: int, b: int) -> int:"
+        ),
+        EditOperation(
+            oldText="def sub(a, b):", newText="def sub(a: int, b: int) -> int:"
+        ),
+    ]
+
+    diff = await apply_file_edits(str(target), edits)
+
+    assert target.read_text(encoding="utf-8") == (
+        "def add(a: int, b: int) -> int:\n    return a + b\n\n\n"
+        "def sub(a: int, b: int) -> int:\n    return a - b\n"
+    )
+    assert "-def add(a, b):" in diff
+    assert "+def sub(a: int, b: int) -> int:" in diff
+
+
+@pytest.mark.asyncio
+async def test_apply_file_edits_concurrent_edits_to_same_file(tmp_path):
+    """同じファイルへの編集を並行して実行しても、どちらの変更も失われないか検証する"""
+    target = tmp_path / "sample.py"
+    target.write_text("a = 1\nb = 2\n", encoding="utf-8")
+
+    await asyncio.gather(
+        apply_file_edits(
+            str(target), [EditOperation(oldText="a = 1", newText="a = 10")]
+        ),
+        apply_file_edits(
+            str(target), [EditOperation(oldText="b = 2", newText="b = 20")]
+        ),
+    )
+
+    assert target.read_text(encoding="utf-8") == "a = 10\nb = 20\n"
+
+
+@pytest.mark.parametrize(
+    "content, edits",
+    [
+        # 置換箇所が重なりうる
+        (
+            "abbb",
+            [
+                EditOperation(oldText="bb", newText="a"),
+                EditOperation(oldText="ab", newText="a"),
+            ],
+        ),
+        # 前の置換によって後の oldText が新たに現れる
+        (
+            "adbbc",
+            [
+                EditOperation(oldText="d", newText=""),
+                EditOperation(oldText="bb", newText="x"),
+            ],
+        ),
+        # 置換後のテキストに oldText が含まれる
+        (
+            "foo bar",
+            [
+                EditOperation(oldText="foo", newText="bar"),
+                EditOperation(oldText="bar", newText="baz"),
+            ],
+        ),
+    ],
+)
+def test_apply_literal_edits_in_one_pass_falls_back(content, edits):
+    """順番に適用した場合と結果が異なりうる編集はまとめて置換しないか検証する"""
+    assert apply_literal_edits_in_one_pass(content, edits) is None
+    # 順番に適用する処理では従来通りに置換される
+    assert apply_edits_sequentially(content, edits)
+
+
+def test_apply_literal_edits_in_one_pass_large_old_texts():
+    """長い oldText 同士でも重なりを判定し、順番に適用した場合と同じ結果になるか検証する"""
+    first = "a" * 5000 + "b"
+    second = "c" * 5000 + "d"
+    separator = "-" * len(first)
+    content = f"{first}\n{separator}\n{second}\n"
+    edits = [
+        EditOperation(oldText=first, newText="first"),
+        EditOperation(oldText=second, newText="second"),
+    ]
+    assert apply_literal_edits_in_one_pass(content, edits) == (
+        f"first\n{separator}\nsecond\n"
+    )
+
+    # first の末尾と second の先頭が重なりうる場合はまとめて置換しない
+    overlapping = [
+        EditOperation(oldText=first, newText="first"),
+        EditOperation(oldText="b" + "a" * 10, newText="second"),
+    ]
+    assert apply_literal_edits_in_one_pass(first + "a" * 10, overlapping) is None
+
+
+def test_apply_edits_sequentially_whitespace_insensitive_match():
+    """空白の違いで完全一致しない oldText でも行単位で照合し、元のインデントで置換するか検証する"""
+    content = "class A:\n    a = 1  \n    b = 2\n"
+    edits = [
+        EditOperation(oldText="    a = 1\n    b = 2", newText="    a = 10\n    b = 20")
+    ]
+
+    assert apply_edits_sequentially(content, edits) == (
+        "class A:\n    a = 10\n    b = 20\n"
+    )
+
+
+def test_apply_edits_sequentially_mixed_edits():
+    """行単位の照合と完全一致の編集が混在しても、順番に適用されるか検証する"""
+    content = "a = 1  \nb = 2\nc = 3  \nd = 4\n"
+    edits = [
+        EditOperation(oldText="a = 1\nb = 2", newText="a = 10\nb = 20"),
+        EditOperation(oldText="c = 3\nd = 4", newText="c = 30\nd = 40"),
+        EditOperation(oldText="b = 20", newText="b = 200"),
+    ]
+
+    assert apply_edits_sequentially(content, edits) == (
+        "a = 10\nb = 200\nc = 30\nd = 40\n"
+    )
+
+
+def test_apply_edits_sequentially_updates_line_index():
+    """行単位の編集が続いても、前の編集で変わった行や位置で照合できるか検証する"""
+    content = "x = 1  \nz = 0  \nx = 1  \nz = 0  \nend  \n"
+    edits = [
+        # 行数が変わらない編集: 置き換えた行だけ索引が更新される
+        EditOperation(oldText="x = 1\nz = 0", newText="y = 1\nz = 0"),
+        EditOperation(oldText="y = 1\nz = 0", newText="y = 2\nz = 0"),
+        # 1 行目の x はすでに置き換えたため、次の x に一致する
+        EditOperation(oldText="x = 1\nz = 0", newText="w = 1\nw = 2\nw = 3"),
+        # 行数が変わった後も、ずれた位置で照合できる
+        EditOperation(oldText="  w = 3\nend", newText="w = 4\nend"),
+    ]
+
+    assert apply_edits_sequentially(content, edits) == (
+        "y = 2\nz = 0\nw = 1\nw = 2\nw = 4\nend\n"
+    )
+
+
+def test_apply_edits_sequentially_literal_edit_after_line_edit():
+    """行単位の編集の後の完全一致の編集も、行をまたぐ一致をすべて置換するか検証する"""
+    content = "x = 1  \nfoo(a,\n  b)\nfoo(a,\n  b); foo(a,\n  b)\n"
+    edits = [
+        EditOperation(oldText="x = 1", newText="x = 2"),
+        EditOperation(oldText=" x = 2", newText="x = 3"),
+        EditOperation(oldText="(a,\n  b)", newText="(a, b)"),
+        EditOperation(oldText="x = 3\n", newText="x = 3\n\n"),
+    ]
+
+    assert apply_edits_sequentially(content, edits) == (
+        "x = 3\n\nfoo(a, b)\nfoo(a, b); foo(a, b)\n"
+    )
+
+
+def test_apply_edits_sequentially_no_match():
+    """一致する箇所がない場合は ValueError を送出するか検証する"""
+    with pytest.raises(ValueError):
+        apply_edits_sequentially("a\nb\n", [EditOperation(oldText="c\nd", newText="e")])
+
+
+def test_create_unified_diff_keeps_line_numbers_for_localized_changes():
+    """変更箇所の周辺のみ比較しても、ハンクの行番号がファイル全体の位置になるか検証する"""
+    original = "".join(f"line {i}\n" for i in range(1, 101))
+    modified = original.replace("line 50\n", "line fifty\n")
+
+    diff = create_unified_diff(original, modified, "sample.txt")
+
+    assert diff.splitlines() == [
+        "--- sample.txt (original)",
+        "+++ sample.txt (modified)",
+        "@@ -47,7 +47,7 @@",
+        " line 47",
+        " line 48",
+        " line 49",
+        "-line 50",
+        "+line fifty",
+        " line 51",
+        " line 52",
+        " line 53",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_execute_write_and_read_file(workspace):
+    """ファイルの書き込みと読み込みを行い、存在しないファイルには候補を返すか検証する"""
+    target = workspace / "src" / "new.txt"
+    result = await execute_write_file({"path": str(target), "content": "内容\n"})
+    assert "書き込みに成功しました" in result
+
+    assert await execute_read_file({"path": str(target)}) == "内容\n"
+
+    result = await execute_read_file({"path": str(workspace / "main.py")})
+    assert str(workspace / "src" / "main.py") in result
+
+
+@pytest.mark.asyncio
+async def test_execute_list_directory(workspace):
+    """ディレクトリとファイルを区別して一覧表示するか検証する"""
+    result = await execute_list_directory({"path": str(workspace)})
+    assert sorted(result.splitlines()) == [
+        "[DIR] build",
+        "[DIR] src",
+        "[FILE] README.md",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_search_files_skips_symlinks_outside_allowed_directories(
+    workspace, tmp_path_factory
+):
+    """許可ディレクトリの外を指すシンボリックリンクは検索対象から外すか検証する"""
+    outside = tmp_path_factory.mktemp("outside")
+    (outside / "main_outside.py").write_text("", encoding="utf-8")
+    (workspace / "link").symlink_to(outside, target_is_directory=True)
+
+    results = await search_files(str(workspace), "main")
+    assert sorted(results) == [
+        str(workspace / "build" / "main.py"),
+        str(workspace / "src" / "main.py"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_execute_read_file_rejects_non_string_path(workspace):
+    """path が文字列でない場合は ValueError を送出するか検証する"""
+    with pytest.raises(ValueError):
+        await execute_read_file({"path": 123})
+    with pytest.raises(ValueError):
+        await execute_read_file({})
+
+
+@pytest.mark.asyncio
+async def test_apply_file_edits_fences_diff_longer_than_backticks(tmp_path):
+    """差分に含まれるバッククォートの連続より長いフェンスで差分を囲むか検証する"""
+    target = tmp_path / "README.md"
+    target.write_text("```python\nprint(1)\n```\n", encoding="utf-8")
+
+    diff = await apply_file_edits(
+        str(target),
+        [EditOperation(oldText="print(1)", newText="print(2)")],
+        dry_run=True,
+    )
+
+    assert diff.startswith("````diff\n")
+    assert diff.endswith("\n````\n\n")
+    # dry_run ではファイルを変更しない
+    assert target.read_text(encoding="utf-8") == "```python\nprint(1)\n```\n"
+
+
+def test_read_text_file_normalizes_newlines(tmp_path):
+    """チャンクをまたぐ内容を読み込み、改行をテキストモードと同様に変換するか検証する"""
+    target = tmp_path / "large.txt"
+    body = "あいう\r\n" * 30000 + "末尾\r"
+    target.write_bytes(body.encode("utf-8"))
+
+    assert read_text_file(str(target)) == "あいう\n" * 30000 + "末尾\n"
+
+
+@pytest.mark.asyncio
+async def test_execute_read_multiple_files(workspace):
+    """複数ファイルを読み込み、失敗したファイルはエラーとして結果に含めるか検証する"""
+    main_path = str(workspace / "src" / "main.py")
+    missing_path = str(workspace / "missing.py")
+
+    result = await execute_read_multiple_files({"paths": [main_path, missing_path]})
+    main_result, missing_result = result.split("\n---\n")
+
+    assert main_result == f"{main_path}:\nprint('main')\n\n"
+    assert missing_result.startswith(f"{missing_path}: Error - ")
+
+
+@pytest.mark.asyncio
+async def test_execute_get_file_info(workspace):
+    """ファイルの種別、サイズ、更新日時を表示するか検証する"""
+    target = workspace / "src" / "main.py"
+    os.utime(target, ns=(1_700_000_000_000_000_000, 1_700_000_000_500_000_000))
+
+    lines = (await execute_get_file_info({"path": str(target)})).splitlines()
+    info = dict(line.split(": ", 1) for line in lines)
+
+    assert info["size"] == str(len("print('main')\n"))
+    assert info["isFile"] == "True"
+    assert info["isDirectory"] == "False"
+    assert info["modified"] == str(datetime.fromtimestamp(1_700_000_000.5))
+
+
+@pytest.mark.asyncio
+async def test_execute_edit_file(workspace):
+    """ツール引数の編集リストをそのまま適用するか検証する"""
+    target = workspace / "src" / "main.py"
+    result = await execute_edit_file(
+        {
+            "path": str(target),
+            "edits": [{"oldText": "'main'", "newText": "'edited'"}],
+        }
+    )
+
+    assert "+print('edited')" in result
+    assert target.read_text(encoding="utf-8") == "print('edited')\n"
@@ -1,7 +1,18 @@
+import asyncio
+import os
+import sys
+
 import pytest
 import structlog
 
-from llm_coder.shell_command import get_shell_command_tools
+from llm_coder.shell_command import (
+    OutputCapture,
+    ShellCommandProtocol,
+    build_exec_argv,
+    enlarge_pipe_buffers,
+    get_pipe_buffer_size,
+    get_shell_command_tools,
+)
 
 # pytest-asyncio を使用するため、イベントループのフィクスチャは不要な場合が多い
 # pytest が自動的に処理してくれる
@@ -129,3 +140,184 @@ async def test_shell_command_default_timeout(shell_tool_executor):
         "Return code: 0" in result
         or "コマンドは出力を生成しませんでした。" not in result
     )
+
+
+def test_output_capture_keeps_head_and_tail():
+    """上限を超える出力は先頭と末尾のみ保持し、省略したバイト数を示すか検証する"""
+    capture = OutputCapture(10)
+    for chunk in (b"a" * 8, b"a" * 2 + b"b" * 50, b"b" * 50, b"c" * 6, b"c" * 4):
+        capture.feed(chunk)
+    assert capture.getvalue() == (
+        b"a" * 10 + "\n... (100 バイト省略) ...\n".encode() + b"c" * 10
+    )
+
+    capture = OutputCapture(10)
+    capture.feed(b"short")
+    assert capture.getvalue() == b"short"
+
+
+@pytest.mark.asyncio
+async def test_shell_command_large_output(shell_tool_executor):
+    """大量の出力を生成するコマンドでも詰まらずに完了し、出力が丸められるか検証する"""
+    args = {"command": "yes line | head -n 200000; yes err | head -n 200000 1>&2"}
+    result = await shell_tool_executor(args)
+    assert result.startswith("Stdout:\nline\n")
+    assert "省略されました" in result
+    assert result.rstrip().endswith("err")
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(sys.platform != "linux", reason="F_SETPIPE_SZ は Linux のみ対応")
+async def test_enlarge_pipe_buffers():
+    """子プロセスの標準出力・標準エラー出力のパイプバッファが拡張されるか検証する"""
+    import fcntl
+
+    # 標準入力を閉じるまで終了しない cat を使い、確認中にパイプが閉じられないようにする
+    transport, protocol = await asyncio.get_running_loop().subprocess_exec(
+        lambda: ShellCommandProtocol(1024),
+        "cat",
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    enlarge_pipe_buffers(transport)
+    try:
+        for fd in (1, 2):
+            pipe = transport.get_pipe_transport(fd).get_extra_info("pipe")
+            size = fcntl.fcntl(pipe.fileno(), fcntl.F_GETPIPE_SZ)
+            assert size >= get_pipe_buffer_size()
+    finally:
+        transport.get_pipe_transport(0).close()
+        await protocol.finished
+        transport.close()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows では常にシェルを使用する")
+def test_build_exec_argv():
+    """シェルの解釈が不要なコマンドのみ引数リストに分割するか検証する"""
+    assert build_exec_argv("ls -a") == ("ls", "-a")
+    assert build_exec_argv("echo 'a b' \"c d\"") == ("echo", "a b", "c d")
+    # パイプ、変数展開、組み込みコマンド、環境変数の代入、不正な引用符はシェルで実行する
+    assert build_exec_argv("ls | wc -l") is None
+    assert build_exec_argv("echo $HOME") is None
+    assert build_exec_argv("cd /tmp") is None
+    assert build_exec_argv("FOO=1 env") is None
+    assert build_exec_argv("echo 'unterminated") is None
+    # シェルの予約語・組み込みコマンドもシェルで実行する
+    for command in ("type ls", "command -v ls", "time ls /", "hash", "wait", "read x"):
+        assert build_exec_argv(command) is None
+    # PATH から解決できないコマンドや、パスを指定したコマンドもシェルで実行する
+    assert build_exec_argv("some_highly_improbable_non_existent_command") is None
+    assert build_exec_argv("./script.sh") is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "command", ["type ls", "command -v ls", "hash", "wait", "read x"]
+)
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX シェルの組み込みコマンド")
+async def test_shell_command_builtins(shell_tool_executor, command):
+    """シェルの組み込みコマンドが、実行ファイルとして探されずにシェルで実行されるか検証する"""
+    result = await shell_tool_executor({"command": command})
+    assert "見つかりません" not in result
+    assert "Return code: 127" not in result
+    if command in ("type ls", "command -v ls"):
+        assert "ls" in result
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(sys.platform == "win32", reason="シバンは Unix のみ対応")
+async def test_shell_command_script_without_shebang(
+    shell_tool_executor, tmp_path, monkeypatch
+):
+    """シバンのない実行可能スクリプトは、パス指定でも PATH 経由でもシェルで実行されるか検証する"""
+    script = tmp_path / "no_shebang_script"
+    script.write_text("echo from script\n", encoding="utf-8")
+    script.chmod(0o755)
+
+    result = await shell_tool_executor({"command": str(script)})
+    assert "from script" in result
+
+    # PATH から解決されて直接実行を試みた場合も、ENOEXEC でシェルに切り替える
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    build_exec_argv.cache_clear()
+    assert build_exec_argv("no_shebang_script") == ("no_shebang_script",)
+    result = await shell_tool_executor({"command": "no_shebang_script"})
+    assert "from script" in result
+    build_exec_argv.cache_clear()
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(sys.platform == "win32", reason="プロセスグループは Unix のみ対応")
+async def test_shell_command_new_session(shell_tool_executor):
+    """コマンドは新しいセッション (プロセスグループ) で起動するか検証する"""
+    script = "import os; print(os.getpgid(0), os.getsid(0))"
+    result = await shell_tool_executor({"command": f'{sys.executable} -c "{script}"'})
+    pgid, sid = result.removeprefix("Stdout:\n").split()
+    assert int(pgid) != os.getpgid(0)
+    assert int(sid) != os.getsid(0)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="制御端末は Unix のみ対応")
+def test_shell_command_does_not_stop_on_tty_input():
+    """
+    エージェントが端末上で動いていても、端末から入力を読むコマンドが
+    SIGTTIN で停止せず、すぐに失敗して結果が返るか検証する
+    """
+    import fcntl
+    import pty
+    import subprocess
+    import termios
+
+    master, slave = pty.openpty()
+
+    def attach_terminal():
+        # 擬似端末を制御端末とする新しいセッションでエージェント側のプロセスを動かす
+        os.setsid()
+        fcntl.ioctl(slave, termios.TIOCSCTTY, 0)
+
+    script = (
+        "import asyncio\n"
+        "from llm_coder.shell_command import get_shell_command_tools\n"
+        "execute = get_shell_command_tools()[0]['execute']\n"
+        "command = 'read x; echo read=$?; cat /dev/tty; echo tty=$?'\n"
+        "print(asyncio.run(execute({'command': command, 'timeout': 10})))\n"
+    )
+    try:
+        completed = subprocess.run(
+            [sys.executable, "-c", script],
+            stdin=slave,
+            capture_output=True,
+            preexec_fn=attach_terminal,
+            timeout=30,
+        )
+    finally:
+        os.close(slave)
+        os.close(master)
+    output = completed.stdout.decode()
+    assert "タイムアウトしました" not in output
+    assert "read=1" in output
+    assert "tty=1" in output
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(sys.platform == "win32", reason="プロセスグループは Unix のみ対応")
+async def test_shell_command_timeout_kills_process_group(shell_tool_executor, tmp_path):
+    """タイムアウト時にシェルの子孫プロセスもまとめて終了させるか検証する"""
+    marker = tmp_path / "marker"
+    args = {"command": f"(sleep 2; touch {marker}) & sleep 30", "timeout": 1}
+    result = await shell_tool_executor(args)
+    assert "タイムアウトしました" in result
+
+    # 子孫プロセスが残っていれば 2 秒後にファイルが作成される
+    await asyncio.sleep(2.5)
+    assert not marker.exists()
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(sys.platform == "win32", reason="プロセスグループは Unix のみ対応")
+async def test_shell_command_timeout_ignores_sigterm(shell_tool_executor):
+    """SIGTERMを無視するコマンドがタイムアウトしても、killで終了させて結果を返すか検証する"""
+    args = {"command": "trap '' TERM; sleep 30", "timeout": 1}
+    result = await shell_tool_executor(args)
+    assert "タイムアウトしました" in result